@@ -0,0 +1,52 @@
+"""
+Simulates skewed (Zipf-like) traffic routed by HashRing and reports the max / avg
+load over the nodes, plain and in bounded loads mode for a few epsilons.
+
+Every request is routed with find and recorded on its owner, so with bounded loads
+the hot keys overflow to the next nodes clockwise.
+
+Usage: python benchmarks/bench_bounded_load.py [nodes] [spreading_factor] [requests]
+"""
+import random
+import sys
+from time import perf_counter
+
+from phoenix.hash_ring import HashRing
+
+
+def simulate(nodes, spreading_factor, requests, load_epsilon):
+    ring = HashRing(spreading_factor=spreading_factor, load_epsilon=load_epsilon)
+    datas = ["node_{}".format(i) for i in range(nodes)]
+    ring.add_many(datas)
+
+    start = perf_counter()
+    for key in requests:
+        ring.record_load(ring.find(key))
+    elapsed = perf_counter() - start
+
+    loads = [ring.load(d) for d in datas]
+    return max(loads) / (sum(loads) / nodes), len(requests) / elapsed
+
+
+def main():
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    spreading_factor = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+
+    rnd = random.Random(42)
+    # Pareto ranks: a handful of keys get most of the requests
+    requests = ["key_{}".format(int(rnd.paretovariate(1.1))) for _ in range(count)]
+
+    print(
+        "nodes={} spreading_factor={} requests={}".format(
+            nodes, spreading_factor, count
+        )
+    )
+    print("{:<10} {:>10} {:>16}".format("epsilon", "max/avg", "requests/s"))
+    for load_epsilon in (None, 1.0, 0.25, 0.1):
+        ratio, rate = simulate(nodes, spreading_factor, requests, load_epsilon)
+        print("{:<10} {:>10.2f} {:>16.0f}".format(str(load_epsilon), ratio, rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Bytes per entry of LRUCache against CompactLRUCache, measured with tracemalloc.
+Keys and values are allocated before the measurement so only the cache's own
+bookkeeping is counted.
+
+Usage: python benchmarks/bench_cache_memory.py [entries]
+"""
+import sys
+import tracemalloc
+
+from phoenix.cache import LRUCache, CompactLRUCache
+
+
+def bytes_per_entry(cls, keys):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    cache = cls(len(keys))
+    for k in keys:
+        cache.put(k, k)
+
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(keys)
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    keys = [str(i) for i in range(entries)]
+
+    print("entries={}".format(entries))
+    for cls in (LRUCache, CompactLRUCache):
+        print(
+            "{:<18} {:>8.1f} bytes/entry".format(
+                cls.__name__, bytes_per_entry(cls, keys)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
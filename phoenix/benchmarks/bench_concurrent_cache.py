@@ -0,0 +1,78 @@
+"""
+Multi-threaded throughput of ConcurrentLRUCache against a single lock wrapped
+around LRUCache.
+
+Usage: python benchmarks/bench_concurrent_cache.py [threads] [seconds]
+"""
+import sys
+from random import Random
+from threading import Lock, Thread
+from time import perf_counter
+
+from phoenix.cache import LRUCache, ConcurrentLRUCache
+
+CAPACITY = 10000
+KEY_SPACE = 20000
+READ_RATIO = 0.8
+
+
+class LockedLRUCache(object):
+    def __init__(self, capacity):
+        self._cache = LRUCache(capacity)
+        self._lock = Lock()
+
+    def put(self, key, val):
+        with self._lock:
+            self._cache.put(key, val)
+
+    def get(self, key):
+        with self._lock:
+            return self._cache.get(key)
+
+
+def run(cache, threads, seconds):
+    counts = [0] * threads
+    deadline = perf_counter() + seconds
+
+    def worker(tid):
+        rnd = Random(tid)
+        ops = 0
+        while perf_counter() < deadline:
+            for _ in range(100):
+                key = rnd.randrange(KEY_SPACE)
+                if rnd.random() < READ_RATIO:
+                    cache.get(key)
+                else:
+                    cache.put(key, key)
+            ops += 100
+        counts[tid] = ops
+
+    workers = [Thread(target=worker, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / seconds
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    print("threads={} seconds={}".format(threads, seconds))
+    print(
+        "{:<28} {:>12.0f} ops/s".format(
+            "LRUCache + global lock", run(LockedLRUCache(CAPACITY), threads, seconds)
+        )
+    )
+    for segments in (4, 16, 64):
+        print(
+            "{:<28} {:>12.0f} ops/s".format(
+                "ConcurrentLRUCache({})".format(segments),
+                run(ConcurrentLRUCache(CAPACITY, segments), threads, seconds),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
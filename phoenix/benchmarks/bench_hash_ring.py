@@ -0,0 +1,45 @@
+"""
+Keys per second routed by HashRing.find against the batched HashRing.find_many.
+
+Usage: python benchmarks/bench_hash_ring.py [nodes] [spreading_factor] [keys]
+"""
+import sys
+from time import perf_counter
+
+from phoenix.hash_ring import HashRing, np
+
+
+def rate(fn, keys, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        fn(keys)
+        best = min(best, perf_counter() - start)
+    return len(keys) / best
+
+
+def main():
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    spreading_factor = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 1000000
+
+    ring = HashRing(spreading_factor=spreading_factor)
+    for i in range(nodes):
+        ring.add("node_{}".format(i))
+    keys = ["key_{}".format(i) for i in range(count)]
+
+    print(
+        "nodes={} vnodes={} keys={} numpy={}".format(
+            nodes, len(ring._ring), count, np is not None
+        )
+    )
+    print(
+        "{:<12} {:>14.0f} keys/s".format(
+            "find", rate(lambda ks: [ring.find(k) for k in ks], keys)
+        )
+    )
+    print("{:<12} {:>14.0f} keys/s".format("find_many", rate(ring.find_many, keys)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Trace replay harness comparing the hit ratios of TinyLFUCache, LRUCache and
+LFUCache. Every access is a |get| followed by a |put| on a miss.
+
+Usage: python benchmarks/bench_hit_ratio.py [capacity] [trace_file]
+       trace_file has one key per line. Synthetic traces are used when not given.
+"""
+import sys
+from itertools import accumulate
+from random import Random
+
+from phoenix.cache import LRUCache, LFUCache, TinyLFUCache
+
+TRACE_LENGTH = 200000
+KEY_SPACE = 50000
+
+
+def zipf_trace(rnd, length, key_space, s=0.9, offset=0):
+    cum_weights = list(accumulate(1.0 / (i + 1) ** s for i in range(key_space)))
+    keys = range(offset, offset + key_space)
+    return rnd.choices(keys, cum_weights=cum_weights, k=length)
+
+
+def scan_trace(rnd, length, key_space):
+    """
+    Zipf traffic interrupted by long one-hit-wonder scans
+    """
+    trace = []
+    scan_key = 10 * key_space
+    while len(trace) < length:
+        trace.extend(zipf_trace(rnd, 5000, key_space))
+        trace.extend(range(scan_key, scan_key + 2000))
+        scan_key += 2000
+    return trace[:length]
+
+
+def shifting_trace(rnd, length, key_space):
+    """
+    The hot set moves half way through, old hot keys must be forgotten
+    """
+    half = length // 2
+    return zipf_trace(rnd, half, key_space) + zipf_trace(
+        rnd, length - half, key_space, offset=key_space
+    )
+
+
+def replay(cache, trace):
+    hits = 0
+    for key in trace:
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.put(key, key)
+    return hits / len(trace)
+
+
+def main():
+    capacity = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rnd = Random(42)
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            traces = {sys.argv[2]: [line.strip() for line in f]}
+    else:
+        traces = {
+            "zipf": zipf_trace(rnd, TRACE_LENGTH, KEY_SPACE),
+            "zipf + scans": scan_trace(rnd, TRACE_LENGTH, KEY_SPACE),
+            "shifting hot set": shifting_trace(rnd, TRACE_LENGTH, KEY_SPACE),
+        }
+
+    caches = [
+        ("LRUCache", LRUCache),
+        ("LFUCache", LFUCache),
+        ("TinyLFUCache", TinyLFUCache),
+    ]
+
+    print("capacity={}".format(capacity))
+    print("{:<20}".format("trace") + "".join("{:>14}".format(n) for n, _ in caches))
+    for name, trace in traces.items():
+        ratios = [replay(cls(capacity), trace) for _, cls in caches]
+        print("{:<20}".format(name) + "".join("{:>14.2%}".format(r) for r in ratios))
+
+
+if __name__ == "__main__":
+    main()
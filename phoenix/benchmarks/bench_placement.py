@@ -0,0 +1,84 @@
+"""
+Compares the placement engines: HashRing (with vnodes), JumpHash and RendezvousHash.
+For each one: lookup rate of find / find_many, memory held by the engine, balance
+(max / avg keys per data) and the share of the keys moved by adding one more data.
+
+Usage: python benchmarks/bench_placement.py [datas] [spreading_factor] [keys]
+"""
+import sys
+import tracemalloc
+from collections import Counter
+from time import perf_counter
+
+from phoenix.hash_ring import HashRing
+from phoenix.placement import JumpHash, RendezvousHash
+
+
+def rate(fn, keys, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        fn(keys)
+        best = min(best, perf_counter() - start)
+    return len(keys) / best
+
+
+def build(factory, datas):
+    tracemalloc.start()
+    engine = factory()
+    for data in datas:
+        engine.add(data)
+    # Warms up the lookup tables built on demand, they count as memory too
+    engine.find_many(["warm up"])
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return engine, memory
+
+
+def main():
+    count_datas = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    spreading_factor = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+
+    datas = ["node_{}".format(i) for i in range(count_datas)]
+    keys = ["key_{}".format(i) for i in range(count)]
+    engines = [
+        ("HashRing", lambda: HashRing(spreading_factor=spreading_factor)),
+        ("JumpHash", JumpHash),
+        ("Rendezvous", RendezvousHash),
+    ]
+
+    print(
+        "datas={} spreading_factor={} keys={}".format(
+            count_datas, spreading_factor, count
+        )
+    )
+    print(
+        "{:<12} {:>14} {:>14} {:>12} {:>9} {:>8}".format(
+            "engine", "find keys/s", "many keys/s", "memory KB", "max/avg", "moved"
+        )
+    )
+    for name, factory in engines:
+        engine, memory = build(factory, datas)
+        # Rendezvous find costs O(datas), a sample is enough
+        sample = keys[: count // 10]
+        find_rate = rate(lambda ks: [engine.find(k) for k in ks], sample)
+        many_rate = rate(engine.find_many, keys)
+
+        before = engine.find_many(keys)
+        owners = Counter(before)
+        balance = max(owners.values()) / (count / count_datas)
+
+        engine.add("node_new")
+        moved = sum(b != a for b, a in zip(before, engine.find_many(keys))) / count
+
+        print(
+            "{:<12} {:>14.0f} {:>14.0f} {:>12.0f} {:>9.3f} {:>8.4f}".format(
+                name, find_rate, many_rate, memory / 1024, balance, moved
+            )
+        )
+    print("ideal moved on add: {:.4f}".format(1 / (count_datas + 1)))
+
+
+if __name__ == "__main__":
+    main()
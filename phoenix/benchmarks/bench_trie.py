@@ -0,0 +1,125 @@
+"""
+Measures CompressedTrie: build time with insert against from_sorted, with and
+without pausing the garbage collector (and against just sorting the words), then
+the latency of top_k on random prefixes against collecting every completion with
+starts_with and sorting them by score.
+Last, the frozen trie: memory against the dict based one, load time of its file
+and lookup / top_k latencies.
+
+Words are random strings scored with a Pareto distribution, like term popularity.
+
+Usage: python benchmarks/bench_trie.py [words] [k]
+"""
+import os
+import random
+import string
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+from phoenix.trie import CompressedTrie, FrozenTrie
+
+
+def latency(fn, prefixes):
+    start = perf_counter()
+    for prefix in prefixes:
+        fn(prefix)
+    return (perf_counter() - start) / len(prefixes) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    rnd = random.Random(42)
+    letters = string.ascii_lowercase
+    words = {
+        "".join(rnd.choice(letters) for _ in range(rnd.randint(3, 12))): int(
+            rnd.paretovariate(1.1)
+        )
+        for _ in range(count)
+    }
+
+    trie = CompressedTrie()
+    start = perf_counter()
+    for word, score in words.items():
+        trie.insert(word, score=score)
+    inserts = perf_counter() - start
+
+    start = perf_counter()
+    items = sorted(words.items())
+    sorting = perf_counter() - start
+    trie = CompressedTrie.from_sorted((w, None, s) for w, s in items)
+    bulk = perf_counter() - start
+
+    start = perf_counter()
+    trie = CompressedTrie.from_sorted(
+        ((w, None, s) for w, s in items), pause_gc=True
+    )
+    paused = perf_counter() - start + sorting
+
+    print("words={} k={}".format(len(trie), k))
+    print(
+        "build: insert {:.2f}s, sort + from_sorted {:.2f}s, with pause_gc {:.2f}s "
+        "(sort alone {:.2f}s)".format(inserts, bulk, paused, sorting)
+    )
+
+    def sort_all(prefix):
+        completions = trie.starts_with(prefix)
+        return sorted(completions, key=lambda w: -trie.get_score(w))[:k]
+
+    print("{:<8} {:>14} {:>18}".format("prefix", "top_k us", "sort all us"))
+    for length in (1, 2, 3):
+        prefixes = [
+            "".join(rnd.choice(letters) for _ in range(length)) for _ in range(200)
+        ]
+        print(
+            "{:<8} {:>14.1f} {:>18.1f}".format(
+                length,
+                latency(lambda p: trie.top_k(p, k), prefixes),
+                latency(sort_all, prefixes[:20]),
+            )
+        )
+
+    tracemalloc.start()
+    measured = CompressedTrie.from_sorted(items)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del measured
+
+    start = perf_counter()
+    frozen = trie.freeze()
+    freezing = perf_counter() - start
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trie.bin")
+        frozen.save(path)
+        start = perf_counter()
+        loaded = FrozenTrie.from_file(path)
+        loading = perf_counter() - start
+
+        print(
+            "memory: dicts {:.1f} MB, frozen {:.1f} MB (freeze {:.2f}s, "
+            "load {:.1f}ms)".format(
+                memory / 2**20,
+                os.path.getsize(path) / 2**20,
+                freezing,
+                loading * 1e3,
+            )
+        )
+        lookups = [w for w, _ in items[:: max(1, len(items) // 20000)]]
+        prefixes = ["".join(rnd.choice(letters) for _ in range(2)) for _ in range(200)]
+        print("{:<8} {:>14} {:>14}".format("trie", "search us", "top_k us"))
+        for name, t in (("dicts", trie), ("frozen", loaded)):
+            print(
+                "{:<8} {:>14.2f} {:>14.1f}".format(
+                    name,
+                    latency(t.search, lookups),
+                    latency(lambda p: t.top_k(p, k), prefixes),
+                )
+            )
+        del loaded
+
+
+if __name__ == "__main__":
+    main()
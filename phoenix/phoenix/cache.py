@@ -1,4 +1,140 @@
+from array import array
+from collections import namedtuple
+from functools import wraps
+from threading import Event, Lock
+from time import monotonic, perf_counter
 from phoenix.lists import SentinelDoublyList
+from phoenix.timer_wheel import TimerWheel
+from phoenix.workflow import Workflow
+
+
+# Reasons given to the |on_evict| listeners
+EVICTED_CAPACITY = "capacity"
+EVICTED_WEIGHT = "weight"
+EVICTED_EXPIRED = "expired"
+
+CacheStatsSnapshot = namedtuple(
+    "CacheStatsSnapshot",
+    ["hits", "misses", "evictions", "insertions", "updates", "hit_rate"],
+)
+
+
+class CacheStats(object):
+    """
+    Plain integer counters bumped inline by the caches. Cheap enough to be always on
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.insertions = 0
+        self.updates = 0
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def snapshot(self):
+        return CacheStatsSnapshot(
+            self.hits,
+            self.misses,
+            self.evictions,
+            self.insertions,
+            self.updates,
+            self.hit_rate,
+        )
+
+    def merge(self, other):
+        """
+        Adds the counters of @other into this one
+        """
+        self.hits += other.hits
+        self.misses += other.misses
+        self.evictions += other.evictions
+        self.insertions += other.insertions
+        self.updates += other.updates
+        return self
+
+
+class _Expiry(object):
+    """
+    Time to live bookkeeping shared by the caches. Cache nodes carry an @expires_at
+    deadline (|None| for no expiration) and a @timer handle into a TimerWheel so that
+    expired nodes can be found, and unlinked by the cache, without scanning.
+
+    :ttl:         Default expire-after-write, in seconds. |None| disables it
+    :access_ttl:  Expire-after-access, in seconds. Every read pushes the deadline
+                  forward, but never past the write deadline
+    """
+
+    def __init__(self, ttl, access_ttl, clock, resolution):
+        self.ttl = ttl
+        self.access_ttl = access_ttl
+        self._clock = clock
+        self._resolution = resolution
+        # Created on the first entry that can expire, caches without any ttl pay
+        # nothing for it
+        self._wheel = None
+
+    def on_write(self, node, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is None and self.access_ttl is None and node.timer is None:
+            return
+
+        now = self._clock()
+        node.write_expires_at = now + ttl if ttl is not None else None
+        self._set_deadline(node, now)
+
+    def on_access(self, node, now=None):
+        if self.access_ttl is not None:
+            self._set_deadline(node, self._clock() if now is None else now)
+
+    def is_expired(self, node, now=None):
+        if node.expires_at is None:
+            return False
+        return node.expires_at <= (self._clock() if now is None else now)
+
+    def now(self):
+        """
+        Reads the clock once for a whole batch of operations
+        """
+        return self._clock()
+
+    def cancel(self, node):
+        if node.timer is not None:
+            self._wheel.cancel(node.timer)
+            node.timer = None
+
+    def expired(self):
+        """
+        Returns the nodes whose deadline passed. They are already off the wheel
+        """
+        if self._wheel is None or self._wheel.size() == 0:
+            return []
+
+        nodes = self._wheel.advance(self._clock())
+        for n in nodes:
+            n.timer = None
+        return nodes
+
+    def _set_deadline(self, node, now):
+        deadline = node.write_expires_at
+        if self.access_ttl is not None:
+            access_deadline = now + self.access_ttl
+            if deadline is None or access_deadline < deadline:
+                deadline = access_deadline
+
+        node.expires_at = deadline
+        if deadline is None:
+            self.cancel(node)
+        elif node.timer is None:
+            if self._wheel is None:
+                self._wheel = TimerWheel(now, resolution=self._resolution)
+            node.timer = self._wheel.schedule(node, deadline)
+        else:
+            self._wheel.reschedule(node.timer, deadline)
 
 
 class LRUCache(object):
@@ -14,8 +150,35 @@ class LRUCache(object):
         def __init__(self, key, val):
             self.key = key
             self.val = val
+            self.weight = 1
+            self.expires_at = None
+            self.write_expires_at = None
+            self.timer = None
 
-    def __init__(self, capacity):
+    def __init__(
+        self,
+        capacity,
+        ttl=None,
+        access_ttl=None,
+        clock=monotonic,
+        resolution=1.0,
+        weigher=None,
+        max_weight=None,
+        on_evict=None,
+    ):
+        """
+        :capacity:    Max number of entries (|None| for no limit on the count)
+        :ttl:         Default expire-after-write in seconds (|None| never expires)
+        :access_ttl:  Expire-after-access in seconds (|None| disables it)
+        :clock:       Time source, in fractional seconds
+        :resolution:  Granularity, in seconds, of the background reclamation.
+                      Reads are always exact
+        :weigher:     weigher(key, val) -> int. Weight of an entry, e.g. its size in
+                      bytes. Entries weigh 1 when not given
+        :max_weight:  Max total weight of the entries (|None| for no limit)
+        :on_evict:    on_evict(key, val, reason) called after an entry is evicted.
+                      @reason is one of EVICTED_CAPACITY / WEIGHT / EXPIRED
+        """
         # Uses SentinelDoublyList which is simply a doubly linked list that allows O(1)
         # add / update / remove of any node.
         # Honors the eviction of the last recently used which will always live in its
@@ -25,9 +188,18 @@ class LRUCache(object):
         # Hashtable for quick lookup of nodes
         self._lookup = {}
 
-        # Size of the cache. For now, no expanding or shrinking is allowed
+        # Size of the cache. Can be changed at runtime through |resize|
         self._capacity = capacity
 
+        self._expiry = _Expiry(ttl, access_ttl, clock, resolution)
+
+        self._weigher = weigher
+        self._max_weight = max_weight
+        self._weight = 0
+
+        self._on_evict = on_evict
+        self._stats = CacheStats()
+
     @property
     def capacity(self):
         """
@@ -35,45 +207,450 @@ class LRUCache(object):
         """
         return self._capacity
 
-    def put(self, key, val):
+    @property
+    def max_weight(self):
+        """
+        Getter
+        """
+        return self._max_weight
+
+    @property
+    def current_weight(self):
+        """
+        Total weight of the entries currently in the cache
+        """
+        return self._weight
+
+    def stats(self):
+        """
+        Snapshot of the hits / misses / evictions / insertions / updates counters
+        """
+        return self._stats.snapshot()
+
+    def put(self, key, val, ttl=None):
         """
         Puts the @key/@value in the cache. It will evict the oldest entry if the cache
         is at capacity.
+        @ttl overrides the cache's default expire-after-write for this entry
         """
+        if self._capacity == 0:
+            return
+
+        # Expired entries go first so they don't take the place of live ones
+        self.expire()
+
+        weight = self._weigher(key, val) if self._weigher is not None else 1
+        if self._max_weight is not None and weight > self._max_weight:
+            # Would flush the whole cache and still not fit. The old value is stale
+            # so it can't stay either
+            if key in self._lookup:
+                self._remove(self._lookup[key], EVICTED_WEIGHT)
+            return
+
         if key not in self._lookup:
             if self._capacity == self._cache_list.size():
-                tail = self._cache_list.tail()
-
                 # Remove the tail (oldest) from the list and it's key from the lookup
-                self._cache_list.unlink(tail)
-                del self._lookup[tail.key]
+                self._remove(self._cache_list.tail(), EVICTED_CAPACITY)
 
             n = LRUCache.CacheNode(key, val)
             self._cache_list.append_left(n)
             self._lookup[key] = n
+            self._stats.insertions += 1
         else:
             n = self._lookup[key]
             n.val = val
+            self._weight -= n.weight
+            self._stats.updates += 1
 
             # Rotate node to the head of the list (newest)
             self._cache_list.unlink(n)
             self._cache_list.append_left(n)
 
+        n.weight = weight
+        self._weight += weight
+
+        self._expiry.on_write(n, ttl)
+        self._evict_overflow()
+
     def get(self, key):
         """
         Gets the value associated with @key and bump that key to newest.
-        If key is not present, returns |None|
+        If key is not present, or expired, returns |None|
         """
         if key in self._lookup:
             n = self._lookup[key]
+            if self._expiry.is_expired(n):
+                self._remove(n, EVICTED_EXPIRED)
+                self._stats.misses += 1
+                return None
 
             # Rotate node to the head of the list (newest)
             self._cache_list.unlink(n)
             self._cache_list.append_left(n)
+            self._expiry.on_access(n)
+            self._stats.hits += 1
             return n.val
 
+        self._stats.misses += 1
         return None
 
+    def get_many(self, keys):
+        """
+        Batched |get|. Returns a dict with the values found and the list of keys
+        missing (or expired). All the hits are rotated to the head of the list in a
+        single relink, each distinct key counting once, in the order of @keys
+        """
+        hits = {}
+        misses = []
+        touched = []
+        now = self._expiry.now()
+
+        seen = set()
+        for key in keys:
+            if key in seen:
+                continue
+            seen.add(key)
+
+            n = self._lookup.get(key)
+            if n is None:
+                misses.append(key)
+            elif self._expiry.is_expired(n, now):
+                self._remove(n, EVICTED_EXPIRED)
+                misses.append(key)
+            else:
+                hits[key] = n.val
+                self._cache_list.unlink(n)
+                self._expiry.on_access(n, now)
+                touched.append(n)
+
+        self._cache_list.extend_left(touched)
+        self._stats.hits += len(hits)
+        self._stats.misses += len(misses)
+        return hits, misses
+
+    def put_many(self, items, ttl=None):
+        """
+        Batched |put| of a dict or an iterable of (key, value) pairs. Entries are
+        linked to the head in a single relink and the evictions needed to get back
+        to capacity are done once at the end
+        """
+        if self._capacity == 0:
+            return
+
+        self.expire()
+        touched = []
+
+        for key, val in dict(items).items():
+            weight = self._weigher(key, val) if self._weigher is not None else 1
+            n = self._lookup.get(key)
+
+            if self._max_weight is not None and weight > self._max_weight:
+                if n is not None:
+                    self._remove(n, EVICTED_WEIGHT)
+                continue
+
+            if n is None:
+                n = LRUCache.CacheNode(key, val)
+                self._lookup[key] = n
+                self._stats.insertions += 1
+            else:
+                n.val = val
+                self._weight -= n.weight
+                self._cache_list.unlink(n)
+                self._stats.updates += 1
+
+            n.weight = weight
+            self._weight += weight
+            self._expiry.on_write(n, ttl)
+            touched.append(n)
+
+        self._cache_list.extend_left(touched)
+        self._evict_overflow()
+
+    def expire(self):
+        """
+        Drops every entry whose deadline passed and returns how many were dropped
+        """
+        expired = self._expiry.expired()
+        for n in expired:
+            self._remove(n, EVICTED_EXPIRED)
+        return len(expired)
+
+    def resize(self, capacity):
+        """
+        Changes the max number of entries. When shrinking, the oldest entries are
+        evicted in bulk until the cache fits
+        """
+        self._capacity = capacity
+        self._evict_overflow()
+
+    def _evict_overflow(self):
+        # Evicts from the tail until both the entries count and the weight budget
+        # are met
+        if self._capacity is not None:
+            while self._cache_list.size() > self._capacity:
+                self._remove(self._cache_list.tail(), EVICTED_CAPACITY)
+
+        if self._max_weight is not None:
+            while self._weight > self._max_weight:
+                self._remove(self._cache_list.tail(), EVICTED_WEIGHT)
+
+    def _remove(self, n, reason):
+        self._cache_list.unlink(n)
+        del self._lookup[n.key]
+        self._weight -= n.weight
+        self._expiry.cancel(n)
+
+        self._stats.evictions += 1
+        if self._on_evict is not None:
+            self._on_evict(n.key, n.val, reason)
+
+
+class CompactLRUCache(object):
+    """
+    O(1) get/put LRU cache with the same eviction as LRUCache, but without a node
+    object per entry. Keys, values and the prev/next links live in parallel arrays
+    preallocated to @capacity and indexed by slot, so an entry costs a few machine
+    words plus its lookup table entry. Evicted slots go back to a free list, chained
+    through the @next array, and are reused by the next insertion.
+    Only get/put are supported, none of the ttl / weight options of LRUCache.
+    This class is **NOT** Thread Safe
+    """
+
+    NIL = -1
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+
+        self._keys = [None] * capacity
+        self._vals = [None] * capacity
+        # Links are slot numbers. While free, a slot's @next points to the next free
+        # one. Initially every slot is free and chained in order
+        typecode = "i" if capacity < 2 ** 31 else "q"
+        self._next = array(typecode, range(1, capacity + 1))
+        self._prev = array(typecode, [CompactLRUCache.NIL]) * capacity
+        if capacity:
+            self._next[-1] = CompactLRUCache.NIL
+
+        self._free = 0 if capacity else CompactLRUCache.NIL
+        # Newest entry is the head, eviction happens from the tail
+        self._head = CompactLRUCache.NIL
+        self._tail = CompactLRUCache.NIL
+
+        # Hashtable for quick lookup of slots
+        self._lookup = {}
+
+    @property
+    def capacity(self):
+        """
+        Getter
+        """
+        return self._capacity
+
+    def put(self, key, val):
+        """
+        Puts the @key/@value in the cache. It will evict the oldest entry if the cache
+        is at capacity.
+        """
+        slot = self._lookup.get(key)
+        if slot is not None:
+            self._vals[slot] = val
+            self._move_to_head(slot)
+            return
+
+        if self._capacity == 0:
+            return
+
+        if self._free == CompactLRUCache.NIL:
+            self._evict()
+
+        slot = self._free
+        self._free = self._next[slot]
+
+        self._keys[slot] = key
+        self._vals[slot] = val
+        self._link_head(slot)
+        self._lookup[key] = slot
+
+    def get(self, key):
+        """
+        Gets the value associated with @key and bump that key to newest.
+        If key is not present, returns |None|
+        """
+        slot = self._lookup.get(key)
+        if slot is None:
+            return None
+
+        self._move_to_head(slot)
+        return self._vals[slot]
+
+    def _evict(self):
+        slot = self._tail
+        self._unlink(slot)
+        del self._lookup[self._keys[slot]]
+
+        # Drops the references so the key / value can be collected right away
+        self._keys[slot] = None
+        self._vals[slot] = None
+
+        self._next[slot] = self._free
+        self._free = slot
+
+    def _move_to_head(self, slot):
+        if slot != self._head:
+            self._unlink(slot)
+            self._link_head(slot)
+
+    def _link_head(self, slot):
+        self._prev[slot] = CompactLRUCache.NIL
+        self._next[slot] = self._head
+        if self._head != CompactLRUCache.NIL:
+            self._prev[self._head] = slot
+        else:
+            self._tail = slot
+        self._head = slot
+
+    def _unlink(self, slot):
+        prev = self._prev[slot]
+        nxt = self._next[slot]
+
+        if prev != CompactLRUCache.NIL:
+            self._next[prev] = nxt
+        else:
+            self._head = nxt
+
+        if nxt != CompactLRUCache.NIL:
+            self._prev[nxt] = prev
+        else:
+            self._tail = prev
+
+
+class ConcurrentLRUCache(object):
+    """
+    Lock striped LRU cache. The key space is split into @segments independent
+    LRUCache segments, each one guarded by its own lock, so threads touching
+    different segments don't contend with each other.
+    Eviction is LRU per segment, which approximates a global LRU as long as keys
+    hash uniformly across the segments.
+    This class is Thread Safe
+    """
+
+    def __init__(self, capacity, segments=16):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if segments <= 0:
+            raise ValueError("segments must be positive")
+
+        # Never create more segments than entries, otherwise some segments would
+        # have capacity 0 and drop every key hashed to them
+        segments = max(1, min(segments, capacity))
+        self._capacity = capacity
+
+        # Spreads the capacity as evenly as possible. The first |capacity % segments|
+        # segments get one extra entry
+        base, extra = divmod(capacity, segments)
+        self._segments = [
+            LRUCache(base + (1 if i < extra else 0)) for i in range(segments)
+        ]
+        self._locks = [Lock() for _ in range(segments)]
+
+    @property
+    def capacity(self):
+        """
+        Getter
+        """
+        return self._capacity
+
+    @property
+    def segments(self):
+        """
+        Getter
+        """
+        return len(self._segments)
+
+    def put(self, key, val):
+        """
+        Puts the @key/@value in the segment owning @key. It will evict the oldest
+        entry of that segment if the segment is at capacity.
+        """
+        idx = self._segment_idx(key)
+        with self._locks[idx]:
+            self._segments[idx].put(key, val)
+
+    def get(self, key):
+        """
+        Gets the value associated with @key and bump that key to newest within its
+        segment. If key is not present, returns |None|
+        """
+        idx = self._segment_idx(key)
+        with self._locks[idx]:
+            return self._segments[idx].get(key)
+
+    def get_many(self, keys):
+        """
+        Batched |get|, see LRUCache.get_many. The locks of every segment involved
+        are held for the whole batch so it is atomic.
+        """
+        by_segment = {}
+        for key in keys:
+            by_segment.setdefault(self._segment_idx(key), []).append(key)
+
+        hits = {}
+        misses = []
+        with _MultiLock([self._locks[idx] for idx in sorted(by_segment)]):
+            for idx, segment_keys in by_segment.items():
+                segment_hits, segment_misses = self._segments[idx].get_many(
+                    segment_keys
+                )
+                hits.update(segment_hits)
+                misses.extend(segment_misses)
+
+        return hits, misses
+
+    def put_many(self, items):
+        """
+        Batched |put|, see LRUCache.put_many. Atomic like |get_many|
+        """
+        by_segment = {}
+        for key, val in dict(items).items():
+            by_segment.setdefault(self._segment_idx(key), []).append((key, val))
+
+        with _MultiLock([self._locks[idx] for idx in sorted(by_segment)]):
+            for idx, segment_items in by_segment.items():
+                self._segments[idx].put_many(segment_items)
+
+    def stats(self):
+        """
+        Counters summed over all segments
+        """
+        total = CacheStats()
+        for idx, segment in enumerate(self._segments):
+            with self._locks[idx]:
+                total.merge(segment._stats)
+        return total.snapshot()
+
+    def _segment_idx(self, key):
+        return hash(key) % len(self._segments)
+
+
+class _MultiLock(object):
+    """
+    Context manager holding several locks at once. Callers must always pass them
+    in the same (index) order so two batches can't deadlock each other
+    """
+
+    def __init__(self, locks):
+        self._locks = locks
+
+    def __enter__(self):
+        for lock in self._locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, *args):
+        for lock in reversed(self._locks):
+            lock.release()
+
 
 class LFUCache:
     """
@@ -86,42 +663,250 @@ class LFUCache:
             self.key = key
             self.val = val
             self.freq_node = freq_node
+            self.weight = 1
+            self.expires_at = None
+            self.write_expires_at = None
+            self.timer = None
 
     class FrequencyNode:
         def __init__(self, f):
             self.f = f
             self.c_list = SentinelDoublyList()
+            # Set when |decay| merges this node into another one. Cache nodes still
+            # pointing here follow it lazily (see |_freq_node|)
+            self.forward = None
 
-    def __init__(self, capacity):
+    def __init__(
+        self,
+        capacity,
+        ttl=None,
+        access_ttl=None,
+        clock=monotonic,
+        resolution=1.0,
+        weigher=None,
+        max_weight=None,
+        on_evict=None,
+    ):
+        """
+        Same parameters as LRUCache
+        """
         self._capacity = capacity
         self._cache_map = {}
         self._freq_list = SentinelDoublyList()
+        self._expiry = _Expiry(ttl, access_ttl, clock, resolution)
+        self._weigher = weigher
+        self._max_weight = max_weight
+        self._weight = 0
+        self._on_evict = on_evict
+        self._stats = CacheStats()
 
-    def put(self, key, val):
+    @property
+    def capacity(self):
+        """
+        Getter
+        """
+        return self._capacity
+
+    @property
+    def max_weight(self):
+        """
+        Getter
+        """
+        return self._max_weight
+
+    @property
+    def current_weight(self):
+        """
+        Total weight of the entries currently in the cache
+        """
+        return self._weight
+
+    def stats(self):
+        """
+        Snapshot of the hits / misses / evictions / insertions / updates counters
+        """
+        return self._stats.snapshot()
+
+    def put(self, key, val, ttl=None):
         if self._capacity == 0:
             return
 
-        if len(self._cache_map) == self._capacity and key not in self._cache_map:
-            self._evict()
-
-        self._update(key, val)
+        self.expire()
+        self._put(key, val, ttl)
 
     def get(self, key):
         if key not in self._cache_map:
+            self._stats.misses += 1
             return None
 
         cnode = self._cache_map[key]
+        if self._expiry.is_expired(cnode):
+            self._remove(cnode, EVICTED_EXPIRED)
+            self._stats.misses += 1
+            return None
+
         self._update(key, cnode.val)
+        self._expiry.on_access(cnode)
+        self._stats.hits += 1
         return cnode.val
 
-    def _evict(self):
+    def get_many(self, keys):
+        """
+        Batched |get|. Returns a dict with the values found and the list of keys
+        missing (or expired). Each distinct key bumps its frequency and counts in
+        the stats once
+        """
+        hits = {}
+        misses = []
+        now = self._expiry.now()
+
+        seen = set()
+        for key in keys:
+            if key in seen:
+                continue
+            seen.add(key)
+
+            cnode = self._cache_map.get(key)
+            if cnode is None:
+                misses.append(key)
+            elif self._expiry.is_expired(cnode, now):
+                self._remove(cnode, EVICTED_EXPIRED)
+                misses.append(key)
+            else:
+                hits[key] = cnode.val
+                self._update(key, cnode.val)
+                self._expiry.on_access(cnode, now)
+
+        self._stats.hits += len(hits)
+        self._stats.misses += len(misses)
+        return hits, misses
+
+    def put_many(self, items, ttl=None):
+        """
+        Batched |put| of a dict or an iterable of (key, value) pairs. Expired
+        entries are reclaimed once for the whole batch
+        """
+        if self._capacity == 0:
+            return
+
+        self.expire()
+        for key, val in dict(items).items():
+            self._put(key, val, ttl)
+
+    def _put(self, key, val, ttl):
+        weight = self._weigher(key, val) if self._weigher is not None else 1
+        if self._max_weight is not None and weight > self._max_weight:
+            if key in self._cache_map:
+                self._remove(self._cache_map[key], EVICTED_WEIGHT)
+            return
+
+        if key in self._cache_map:
+            prev_weight = self._cache_map[key].weight
+            self._stats.updates += 1
+        else:
+            if len(self._cache_map) == self._capacity:
+                self._evict(EVICTED_CAPACITY)
+            prev_weight = 0
+            self._stats.insertions += 1
+
+        cnode = self._update(key, val)
+        cnode.weight = weight
+        self._weight += weight - prev_weight
+
+        self._expiry.on_write(cnode, ttl)
+
+        if self._max_weight is not None:
+            # Evicts from the lowest frequency bucket until the budget is met. The entry
+            # just written is never the victim
+            while self._weight > self._max_weight:
+                self._evict(EVICTED_WEIGHT, exclude=cnode)
+
+    def expire(self):
+        """
+        Drops every entry whose deadline passed and returns how many were dropped
+        """
+        expired = self._expiry.expired()
+        for cnode in expired:
+            self._remove(cnode, EVICTED_EXPIRED)
+        return len(expired)
+
+    def resize(self, capacity):
+        """
+        Changes the max number of entries. When shrinking, the least frequently used
+        entries are evicted in bulk until the cache fits
+        """
+        self._capacity = capacity
+        if capacity is not None:
+            while len(self._cache_map) > capacity:
+                self._evict(EVICTED_CAPACITY)
+
+    def decay(self, reset=False):
+        """
+        Halves the frequency of every entry (or resets it to 1 if @reset) so keys that
+        were hot a long time ago can be evicted again. Relative order is kept.
+        Walks the frequency nodes only, never the cache nodes: the cache lists of
+        frequency nodes that end up with the same frequency are spliced in O(1) and
+        the emptied frequency node forwards to the surviving one.
+        """
+        prev = None
         fnode = self._freq_list.head()
+        while fnode is not None:
+            fnext = self._freq_list.next(fnode)
+            new_f = 1 if reset else max(1, fnode.f // 2)
 
-        cache_node = fnode.c_list.pop_left()
-        del self._cache_map[cache_node.key]
+            if prev is not None and prev.f == new_f:
+                # Lower frequencies first so they stay the first ones evicted
+                prev.c_list.extend(fnode.c_list)
+                self._freq_list.unlink(fnode)
+                fnode.forward = prev
+            else:
+                fnode.f = new_f
+                prev = fnode
+
+            fnode = fnext
+
+    def _freq_node(self, cnode):
+        """
+        Frequency node of @cnode, following the forwards left by |decay|. Compresses
+        the path like DisjointSets so each forward is followed at most once per node
+        """
+        fnode = cnode.freq_node
+        if fnode.forward is None:
+            return fnode
+
+        root = fnode
+        while root.forward is not None:
+            root = root.forward
+
+        while fnode is not root:
+            fnode.forward, fnode = root, fnode.forward
+
+        cnode.freq_node = root
+        return root
+
+    def _evict(self, reason, exclude=None):
+        fnode = self._freq_list.head()
+        victim = fnode.c_list.head()
+        if victim is exclude:
+            victim = fnode.c_list.next(victim)
+            if victim is None:
+                victim = self._freq_list.next(fnode).c_list.head()
+
+        self._remove(victim, reason)
+
+    def _remove(self, cnode, reason):
+        fnode = self._freq_node(cnode)
+        fnode.c_list.unlink(cnode)
+        del self._cache_map[cnode.key]
+        self._weight -= cnode.weight
+        self._expiry.cancel(cnode)
 
         if fnode.c_list.size() == 0:
-            self._freq_list.pop_left()
+            self._freq_list.unlink(fnode)
+
+        self._stats.evictions += 1
+        if self._on_evict is not None:
+            self._on_evict(cnode.key, cnode.val, reason)
 
     def _update(self, key, val):
         if key in self._cache_map:
@@ -131,7 +916,7 @@ class LFUCache:
 
             # We need the frequency node to unlink the cache node and move the latter
             # to the next frequence (f + 1)
-            fnode = cnode.freq_node
+            fnode = self._freq_node(cnode)
 
             # Frequency gets bump by one and the "next" node might or might not be
             # the node for the new frequency
@@ -173,3 +958,321 @@ class LFUCache:
             cnode = LFUCache.CacheNode(key, val, fnode)
             fnode.c_list.append(cnode)
             self._cache_map[key] = cnode
+
+        return cnode
+
+
+class CountMinSketch(object):
+    """
+    Count-min sketch of 4 bit saturating counters used to estimate how often keys
+    were seen. After @sample_size increments every counter is halved, so the
+    estimates follow the recent popularity instead of the all time one.
+    This class is **NOT** Thread Safe
+    """
+
+    MAX_COUNT = 15
+    _MASK64 = (1 << 64) - 1
+    # bytes.translate table that halves every counter in a single C pass
+    _HALVE = bytes(i >> 1 for i in range(256))
+
+    def __init__(self, width, depth=4, sample_size=None):
+        # Power of two width so the row index is a mask instead of a modulo
+        self._width = 1 << max(4, (width - 1).bit_length())
+        self._depth = depth
+        self._table = bytearray(self._width * depth)
+        self._sample_size = sample_size or 10 * width
+        self._additions = 0
+
+    def increment(self, key):
+        added = False
+        for idx in self._indexes(key):
+            if self._table[idx] < CountMinSketch.MAX_COUNT:
+                self._table[idx] += 1
+                added = True
+
+        if added:
+            self._additions += 1
+            if self._additions >= self._sample_size:
+                self.age()
+
+    def estimate(self, key):
+        return min(self._table[idx] for idx in self._indexes(key))
+
+    def age(self):
+        """
+        Halves all counters
+        """
+        self._table = bytearray(self._table.translate(CountMinSketch._HALVE))
+        self._additions //= 2
+
+    def _indexes(self, key):
+        # Mixes the builtin hash (ints hash to themselves) and derives one index per
+        # row by double hashing
+        h = (hash(key) * 0x9E3779B97F4A7C15) & CountMinSketch._MASK64
+        h1 = h >> 32
+        h2 = (h & 0xFFFFFFFF) | 1
+        mask = self._width - 1
+        return [
+            row * self._width + ((h1 + row * h2) & mask) for row in range(self._depth)
+        ]
+
+
+class TinyLFUCache(object):
+    """
+    W-TinyLFU cache. New entries land in a small LRU window. Entries leaving the
+    window compete with the LRU victim of the main region, a segmented LRU
+    (probation + protected), and only the one the CountMinSketch estimates as more
+    frequent stays. The window absorbs bursts while the sketch keeps one hit
+    wonders and scans from flushing the main region, and its aging lets old hot
+    keys go.
+    This class is **NOT** Thread Safe
+    """
+
+    WINDOW = 0
+    PROBATION = 1
+    PROTECTED = 2
+
+    class CacheNode(object):
+        def __init__(self, key, val, region):
+            self.key = key
+            self.val = val
+            self.region = region
+
+    def __init__(self, capacity, window_ratio=0.01, protected_ratio=0.8):
+        """
+        :capacity:         Max number of entries
+        :window_ratio:     Fraction of the capacity given to the LRU window
+        :protected_ratio:  Fraction of the main region given to the protected segment
+        """
+        self._capacity = capacity
+        self._window_capacity = min(capacity, max(1, int(capacity * window_ratio)))
+        self._main_capacity = capacity - self._window_capacity
+        self._protected_capacity = int(self._main_capacity * protected_ratio)
+
+        # Newest entries live in the head of each list, victims in the tail
+        self._window = SentinelDoublyList()
+        self._probation = SentinelDoublyList()
+        self._protected = SentinelDoublyList()
+        self._lookup = {}
+
+        self._sketch = CountMinSketch(max(1, capacity))
+
+    @property
+    def capacity(self):
+        """
+        Getter
+        """
+        return self._capacity
+
+    def put(self, key, val):
+        """
+        Puts the @key/@value in the cache. New keys go to the window and may push
+        the oldest window entry through the admission filter.
+        """
+        if self._capacity == 0:
+            return
+
+        self._sketch.increment(key)
+
+        if key in self._lookup:
+            n = self._lookup[key]
+            n.val = val
+            self._on_hit(n)
+            return
+
+        n = TinyLFUCache.CacheNode(key, val, TinyLFUCache.WINDOW)
+        self._window.append_left(n)
+        self._lookup[key] = n
+
+        if self._window.size() > self._window_capacity:
+            self._admit(self._window.pop())
+
+    def get(self, key):
+        """
+        Gets the value associated with @key. If key is not present, returns |None|
+        """
+        self._sketch.increment(key)
+
+        if key in self._lookup:
+            n = self._lookup[key]
+            self._on_hit(n)
+            return n.val
+
+        return None
+
+    def _on_hit(self, n):
+        if n.region == TinyLFUCache.WINDOW:
+            self._window.unlink(n)
+            self._window.append_left(n)
+        elif n.region == TinyLFUCache.PROBATION:
+            # Second hit while on probation, promote it
+            self._probation.unlink(n)
+            n.region = TinyLFUCache.PROTECTED
+            self._protected.append_left(n)
+
+            if self._protected.size() > self._protected_capacity:
+                demoted = self._protected.pop()
+                demoted.region = TinyLFUCache.PROBATION
+                self._probation.append_left(demoted)
+        else:
+            self._protected.unlink(n)
+            self._protected.append_left(n)
+
+    def _admit(self, candidate):
+        """
+        @candidate was just pushed out of the window. It goes into probation if
+        there is room, otherwise it has to beat the main region victim.
+        """
+        candidate.region = TinyLFUCache.PROBATION
+        if self._probation.size() + self._protected.size() < self._main_capacity:
+            self._probation.append_left(candidate)
+            return
+
+        victim = self._probation.tail() or self._protected.tail()
+        if victim is None or (
+            self._sketch.estimate(candidate.key) <= self._sketch.estimate(victim.key)
+        ):
+            del self._lookup[candidate.key]
+            return
+
+        if victim.region == TinyLFUCache.PROBATION:
+            self._probation.unlink(victim)
+        else:
+            self._protected.unlink(victim)
+        del self._lookup[victim.key]
+        self._probation.append_left(candidate)
+
+
+class CacheExpirationWorkflow(Workflow):
+    """
+    Workflow that periodically reclaims the expired entries of a cache when it runs
+    on a WorkflowEngine. Caches are not thread safe, so @lock (if given) must be the
+    same lock the application holds around the cache calls.
+    """
+
+    def __init__(self, cache, interval_secs=1.0, lock=None):
+        self._cache = cache
+        self._interval_secs = interval_secs
+        self._lock = lock
+
+    def run_step(self):
+        if self._lock is None:
+            self._cache.expire()
+        else:
+            with self._lock:
+                self._cache.expire()
+        return self._interval_secs
+
+    def on_early_stop(self):
+        pass
+
+
+MemoStats = namedtuple(
+    "MemoStats", ["hits", "misses", "loads", "load_failures", "total_load_time"]
+)
+
+
+class _Flight(object):
+    """
+    A load in progress. Callers missing on the same key wait on it instead of
+    loading the value again
+    """
+
+    def __init__(self):
+        self.done = Event()
+        self.val = None
+        self.error = None
+
+
+# Separates the positional from the keyword arguments in the memoization keys
+_KWARGS_MARK = object()
+
+
+def _make_key(args, kwargs):
+    key = args
+    if kwargs:
+        key += (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+    return key
+
+
+def cached(capacity=128, policy="lru", ttl=None):
+    """
+    Memoization decorator storing the results in a LRUCache or LFUCache. Arguments
+    must be hashable.
+    Concurrent misses on the same arguments are collapsed into a single call to the
+    decorated function (single flight), the other callers wait for its result. If
+    the call raises, every waiter gets the exception and nothing is cached.
+
+    The decorated function exposes:
+        .stats()  MemoStats with the hits / misses / loads counters and the total
+                  time, in seconds, spent loading
+        .cache    The underlying cache
+
+    :capacity:  Max number of results kept
+    :policy:    "lru" or "lfu"
+    :ttl:       Expire-after-write in seconds (|None| never expires)
+    """
+    policies = {"lru": LRUCache, "lfu": LFUCache}
+    if policy not in policies:
+        raise ValueError("Unknown cache policy {}".format(policy))
+
+    def decorator(fn):
+        cache = policies[policy](capacity, ttl=ttl)
+        lock = Lock()
+        flights = {}
+        # hits, misses, loads, load_failures, total_load_time
+        counters = [0, 0, 0, 0, 0.0]
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = _make_key(args, kwargs)
+
+            with lock:
+                # Values are boxed in a tuple so functions returning |None| can be
+                # told apart from a miss
+                boxed = cache.get(key)
+                if boxed is not None:
+                    counters[0] += 1
+                    return boxed[0]
+
+                counters[1] += 1
+                flight = flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = flights[key] = _Flight()
+
+            if not leader:
+                flight.done.wait()
+                if flight.error is not None:
+                    raise flight.error
+                return flight.val
+
+            start = perf_counter()
+            try:
+                flight.val = fn(*args, **kwargs)
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                elapsed = perf_counter() - start
+                with lock:
+                    counters[2] += 1
+                    counters[4] += elapsed
+                    if flight.error is None:
+                        cache.put(key, (flight.val,))
+                    else:
+                        counters[3] += 1
+                    del flights[key]
+                flight.done.set()
+
+            return flight.val
+
+        def stats():
+            with lock:
+                return MemoStats(*counters)
+
+        wrapper.stats = stats
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -1,11 +1,123 @@
-from random import randint
-from bisect import bisect_right
+import pickle
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import namedtuple
-from phoenix.utils import merge_sorted
-from typing import List, Set
+from hashlib import blake2b
+from math import ceil, sqrt
+from mmap import mmap, ACCESS_READ
+from operator import attrgetter
+from struct import Struct
+from typing import Iterable, List, Set
+
+try:
+    import numpy as np
+except ImportError:  # find_many falls back to bisect
+    np = None
+
+try:
+    import xxhash
+except ImportError:  # xxhash_hash raises without it
+    xxhash = None
+
+
+def _key_bytes(key) -> bytes:
+    # Keys are hashed by their text form, so 1 and "1" land on the same spot
+    if isinstance(key, (bytes, bytearray)):
+        return bytes(key)
+    return str(key).encode("utf-8")
+
+
+def blake2b_hash(key) -> int:
+    """
+    Stable 64 bit hash, the same on every process and machine. Default key hasher
+    """
+    return int.from_bytes(blake2b(_key_bytes(key), digest_size=8).digest(), "little")
+
+
+def xxhash_hash(key) -> int:
+    """
+    Stable 64 bit xxh64 hash. Faster than blake2b_hash, but requires xxhash on every
+    process sharing the ring
+    """
+    if xxhash is None:
+        raise RuntimeError("xxhash_hash requires xxhash (pip install xxhash)")
+    return xxhash.xxh64_intdigest(_key_bytes(key))
+
+
+def _blake2b_hash_array(keys):
+    # blake2b_hash of every key, as a NumPy uint64 array
+    digests = b"".join(
+        [
+            blake2b(
+                k.encode("utf-8") if type(k) is str else _key_bytes(k), digest_size=8
+            ).digest()
+            for k in keys
+        ]
+    )
+    return np.frombuffer(digests, dtype="<u8")
+
+
+# Batched versions of the key hashers, used by |_hash_array|
+_ARRAY_HASHERS = {blake2b_hash: _blake2b_hash_array}
+
+
+def _hash_array(hasher, keys, modulo=None):
+    """
+    @hasher of every key, modulo @modulo (2^64 if not given), as a NumPy uint64
+    array. The hashers with a batched version only compute the raw digests per key
+    and turn them into ints in one go, the others are called once per key
+    """
+    array_hasher = _ARRAY_HASHERS.get(hasher)
+    if array_hasher is not None:
+        hashes = array_hasher(keys)
+        return hashes if modulo is None else hashes % np.uint64(modulo)
+    # Python's modulo, so negative hashes (e.g. builtin_hash) land where they do
+    # with a single key
+    modulo = modulo or 2**64
+    return np.fromiter((hasher(k) % modulo for k in keys), dtype=np.uint64)
+
+
+def builtin_hash(key) -> int:
+    """
+    Python's hash(). Fast but salted per process for str / bytes (PYTHONHASHSEED), so
+    processes only agree when they share the seed
+    """
+    return hash(key)
+
+
+def _hasher_name(hasher) -> str:
+    """
+    Identity of a key hasher saved in the snapshots: module and qualified name of a
+    function, or of the type of a callable object (e.g. functools.partial)
+    """
+    name = getattr(hasher, "__qualname__", None) or type(hasher).__qualname__
+    module = getattr(hasher, "__module__", None) or type(hasher).__module__
+    return "{}.{}".format(module, name)
+
+
+def _object_array(values):
+    # NumPy object array of @values. Element-wise so tuple-like values aren't
+    # broadcast into dimensions
+    values = list(values)
+    result = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        result[i] = v
+    return result
+
 
 PartitionRange = namedtuple("PartitionRange", ["start", "count"])
 
+# Share of RING_SIZE owned by each data, their standard deviation and the ratio of
+# the biggest one to the average
+RingBalance = namedtuple("RingBalance", ["fractions", "stddev", "max_avg"])
+
+# Totals of a list of ReshardUnit: units, ranges, ring positions moving (and that
+# as a fraction of RING_SIZE) and the estimated bytes moving, see |reshard_cost|
+ReshardCost = namedtuple(
+    "ReshardCost", ["moves", "ranges", "count", "fraction", "bytes"]
+)
+
 
 class RingNode(object):
     def __init__(self, start, data=None):
@@ -51,97 +163,760 @@ class ReshardUnit(object):
         )
 
 
+def reshard_cost(moves: List[ReshardUnit], total_bytes: int = None) -> ReshardCost:
+    """
+    Sums up the @moves of a ring change (or of a dry run). With @total_bytes, the
+    size of the whole data set, also estimates the bytes moving assuming the keys
+    spread evenly over the ring
+    """
+    ranges = 0
+    count = 0
+    for m in moves:
+        ranges += len(m.ranges)
+        count += sum(r.count for r in m.ranges)
+
+    fraction = count / HashRing.RING_SIZE
+    return ReshardCost(
+        moves=len(moves),
+        ranges=ranges,
+        count=count,
+        fraction=fraction,
+        bytes=None if total_bytes is None else round(fraction * total_bytes),
+    )
+
+
+class _RingSnapshot(object):
+    """
+    Read-only view of the nodes of a ring loaded by |HashRing.from_bytes|. The
+    arrays are the snapshot's own memory (e.g. a mmap), nodes are built on access
+    """
+
+    # magic, nodes, spreading_factor, length of the pickled meta
+    HEADER = Struct("<8sIIQ")
+    MAGIC = b"PHXRING1"
+
+    def __init__(self, buffer):
+        magic, count, self.spreading_factor, meta_len = self.HEADER.unpack_from(
+            buffer
+        )
+        if magic != self.MAGIC:
+            raise ValueError("not a HashRing snapshot")
+
+        # Keeps the mmap alive as long as the views over it
+        self.buffer = buffer
+        offset = self.HEADER.size
+        self.starts = _uint32_view(buffer, offset, count)
+        self.owner_ids = _uint32_view(buffer, offset + 4 * count, count)
+        self.vnodes = _uint32_view(buffer, offset + 8 * count, count)
+        meta_offset = offset + 12 * count
+        meta = pickle.loads(buffer[meta_offset : meta_offset + meta_len])
+        self.owners = meta["owners"]
+        self.key_hasher_name = meta["key_hasher"]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, idx):
+        return RingNode(self.starts[idx], self.owners[self.owner_ids[idx]])
+
+
+def _uint32_view(buffer, offset, count):
+    # Zero-copy on little endian machines, the snapshot's byte order
+    view = memoryview(buffer)[offset : offset + 4 * count].cast("I")
+    if sys.byteorder == "big":
+        view = array("I", view)
+        view.byteswap()
+    return view
+
+
 class HashRing(object):
     RING_SIZE = 1 * 1000 * 1000 * 1000  # 1 Billion
+    # Above this many new nodes, a single merge of the sorted lists is cheaper than
+    # inserting (shifting the lists) each node on its own
+    MERGE_THRESHOLD = 32
+    # Consecutive colliding hashes tolerated from a hash_generator
+    MAX_HASH_ATTEMPTS = 1000
+
+    def __init__(
+        self,
+        spreading_factor: int = 1,
+        key_hasher=blake2b_hash,
+        load_epsilon: float = None,
+    ):
+        """
+        :spreading_factor:  Number of nodes (virtual nodes) added per @data
+        :key_hasher: int(key)  Hashes the partition keys, and the node identities
+                               when placing nodes. Every process sharing the ring
+                               must use the same one
+        :load_epsilon:      Opt-in bounded loads (consistent hashing with bounded
+                            loads). Each @data may hold up to (1 + load_epsilon)
+                            times its share of the load recorded through
+                            |record_load|, and |find| walks clockwise past the
+                            saturated ones. |None| disables it
+        """
+        if load_epsilon is not None and load_epsilon <= 0:
+            raise ValueError("load_epsilon must be positive")
 
-    def __init__(self, spreading_factor: int = 1):
         self.spreading_factor = spreading_factor
+        self._key_hasher = key_hasher
         self._ring = []
+        # Plain int copy of the ring starts, so lookups can bisect without building
+        # a temporary RingNode. Kept in sync with |_ring|
+        self._starts = []
+        # NumPy copies of the starts / owners for |find_many|. Built on demand and
+        # dropped every time the ring changes
+        self._np_starts = None
+        self._np_owners = None
+        # Distinct successors of every node, for |find_replicas|. Built on demand
+        # for up to |_replicas_n| replicas and dropped every time the ring changes
+        self._replicas = None
+        self._replicas_n = 0
+        # Set while the ring is a loaded snapshot, see |from_bytes|
+        self._snapshot = None
+        # data -> its nodes, so they can be taken out without scanning the ring
+        self._nodes_by_data = {}
+        # Same as |_starts| but for O(1) collision checks when placing new nodes
+        self._used_starts = set()
+        # data -> load recorded on it, for the bounded loads mode
+        self._load_epsilon = load_epsilon
+        self._loads = {}
+        self._total_load = 0
 
     def add(
-        self, data: object, hash_generator=lambda: randint(0, HashRing.RING_SIZE - 1)
+        self, data: object, hash_generator=None, weight: float = 1
     ) -> List[ReshardUnit]:
         """
-        Adds @self.spreading_factor new nodes to the ring. All new nodes will point
-        to @data.
+        Adds @self.spreading_factor new nodes to the ring, scaled by @weight. All new
+        nodes will point to @data.
 
         :data: str              The data hanging on the nodes being added.
         :hash_generator: int()  The function to generate the ring location for the new nodes
-                                Must return a number in interval [0 - 1B)
+                                Must return a number in interval [0 - 1B).
+                                By default the locations derive from @data's identity
+                                (see |_node_hash_generator|) so every process adding
+                                the same datas builds the same ring
+        :weight: float          Relative capacity of @data, e.g. 2 for a host twice
+                                as big. It gets round(spreading_factor * weight)
+                                nodes (at least one) and so that share of the keys
         """
-        moves = []
+        return self.add_many([data], hash_generator, weight)
+
+    def add_many(
+        self, datas: Iterable[object], hash_generator=None, weight: float = 1
+    ) -> List[ReshardUnit]:
+        """
+        Adds the nodes of all @datas in a single pass, e.g. to bootstrap a cluster.
+        Same parameters and moves as |add|, the ranges each new node takes are
+        computed against the ring before any of the @datas were added.
+        """
+        self._thaw()
+        count = self._vnode_count(weight)
         new_nodes = []
-        # We need a copy of the previous state to be able to compute the [from -> to] data
-        # movement
-        old_ring = [n for n in self._ring]
-
-        for _ in range(self.spreading_factor):
-            node = RingNode(
-                start=self._create_node_hash(
-                    hash_generator, set([n.start for n in old_ring])
-                ),
-                data=data,
-            )
-            new_nodes.append(node)
+        try:
+            for data in datas:
+                self._create_nodes(data, range(count), hash_generator, new_nodes)
+        except ValueError:
+            # Leaves the ring as it was
+            self._used_starts.difference_update(n.start for n in new_nodes)
+            raise
 
-        new_nodes.sort()
-        self._ring = merge_sorted(self._ring, new_nodes)
+        for n in new_nodes:
+            self._nodes_by_data.setdefault(n.data, []).append(n)
 
-        if len(old_ring) == 0:
-            return moves
+        return self._insert_nodes(new_nodes)
 
-        for n in new_nodes:
-            # Using the old ring (before adding the new nodes), find where the current
-            # new starting point was located.
-            # We now know where we are "moving the data from"
-            from_node = HashRing._find_partition(old_ring, n.start)
-            # The |start| field marks the start of the range. So everything that hashes to
-            # "the right" of that start, in other words from current.start to (current + 1).start
-            left_node_idx = HashRing._find_partition_idx(self._ring, n.start)
-            right_node_idx = left_node_idx + 1
-
-            # If the right node index is not outside the bounds of the array, we are not looping
-            # around on the ring, so no special case handling is necessary
-            if right_node_idx < len(self._ring):
-                moves.append(
-                    ReshardUnit(
-                        from_node=from_node,
-                        to_node=self._ring[left_node_idx],
-                        ranges=[
-                            PartitionRange(
-                                start=self._ring[left_node_idx].start,
-                                count=self._ring[right_node_idx].start
-                                - self._ring[left_node_idx].start,
-                            )
-                        ],
-                    )
+    def set_weight(
+        self, data: object, weight: float, hash_generator=None
+    ) -> List[ReshardUnit]:
+        """
+        Changes the weight (see |add|) of @data, already on the ring. Growing adds
+        the missing nodes and shrinking removes its last ones, the other nodes of
+        @data stay where they are, so only the ranges of the nodes added / removed
+        move. Returns those moves. @hash_generator as in |add|, for the new nodes.
+        Raises KeyError if @data is not on the ring.
+        """
+        self._thaw()
+        nodes = self._nodes_by_data[data]
+        count = self._vnode_count(weight)
+
+        if count > len(nodes):
+            new_nodes = []
+            try:
+                self._create_nodes(
+                    data, range(len(nodes), count), hash_generator, new_nodes
+                )
+            except ValueError:
+                self._used_starts.difference_update(n.start for n in new_nodes)
+                raise
+
+            nodes.extend(new_nodes)
+            return self._insert_nodes(new_nodes)
+
+        removed = nodes[count:]
+        del nodes[count:]
+        return self._remove_nodes(removed)
+
+    def remove(self, data: object) -> List[ReshardUnit]:
+        """
+        Removes every node pointing to @data. The range each of them covered moves to
+        the closest remaining node counter clockwise (its predecessor).
+        Costs O(K log N) lookups for K removed nodes (plus the list shifts). The load
+        recorded on @data is dropped.
+        Raises KeyError if @data is not on the ring.
+        """
+        self._thaw()
+        moves = self._remove_nodes(self._nodes_by_data.pop(data))
+        # Whoever takes over its keys records that load again
+        self._total_load -= self._loads.pop(data, 0)
+        return moves
+
+    def find(self, partition_key: str):
+        """
+        Returns the @data hanging on the node covering the given partition key.
+        In bounded loads mode, the first @data clockwise from there that isn't
+        saturated (see |load_capacity|)
+        """
+        partition_hash = self._key_hasher(partition_key) % HashRing.RING_SIZE
+        # Index -1 (hash before the first start) is the last node, the wrap around
+        idx = bisect_right(self._starts, partition_hash) - 1
+        if self._load_epsilon is None:
+            return self._ring[idx].data
+        return self._find_bounded(idx)
+
+    def find_many(self, partition_keys: Iterable[str], as_array: bool = False):
+        """
+        Batched |find|. Returns the list of @data owning each partition key, in order.
+        With NumPy installed the whole batch is resolved by a single searchsorted
+        over the ring starts (see |_key_positions|), and @as_array returns the owners
+        as a NumPy (object) array instead of a list.
+        """
+        if self._load_epsilon is not None:
+            # Every lookup depends on the loads, there is nothing to batch
+            owners = [self.find(k) for k in partition_keys]
+            if not as_array:
+                return owners
+            if np is None:
+                raise RuntimeError("as_array requires NumPy")
+            return _object_array(owners)
+
+        if np is None:
+            if as_array:
+                raise RuntimeError("as_array requires NumPy")
+            ring = self._ring
+            return [ring[idx].data for idx in self._key_positions(partition_keys)]
+
+        if self._np_owners is None:
+            if self._snapshot is not None:
+                owners = _object_array(self._snapshot.owners)
+                self._np_owners = owners[np.asarray(self._snapshot.owner_ids)]
+            else:
+                self._np_owners = _object_array(n.data for n in self._ring)
+
+        owners = self._np_owners[self._key_positions(partition_keys)]
+        return owners if as_array else owners.tolist()
+
+    def find_replicas(self, partition_key: str, n: int) -> List[object]:
+        """
+        Returns the first @n distinct @data clockwise from the node covering the
+        given partition key, its owner (as in |find|) first. Fewer if there aren't @n
+        datas on the ring. Loads are not taken into account.
+        Lookups cost O(log N + n): they read a table of the distinct successors of
+        every node, built on first use in O(N * n) and dropped when the ring changes
+        """
+        table = self._replica_table(n)
+        partition_hash = self._key_hasher(partition_key) % HashRing.RING_SIZE
+        return list(table[bisect_right(self._starts, partition_hash) - 1][:n])
+
+    def find_replicas_many(
+        self, partition_keys: Iterable[str], n: int
+    ) -> List[List[object]]:
+        """
+        Batched |find_replicas|. The keys are resolved to ring positions as in
+        |find_many|
+        """
+        table = self._replica_table(n)
+        return [list(table[idx][:n]) for idx in self._key_positions(partition_keys)]
+
+    def load(self, data: object) -> int:
+        """
+        Load currently recorded on @data
+        """
+        return self._loads.get(data, 0)
+
+    def load_capacity(self, data: object) -> int:
+        """
+        Max load @data takes in bounded loads mode, counting the one being placed:
+        ceil((1 + load_epsilon) * (total load + 1) * share), where the share of @data
+        is the fraction of the ring nodes it owns (1 / number of datas unless
+        weighted). Raises KeyError if @data is not on the ring, ValueError if the
+        ring has no |load_epsilon|.
+        """
+        if self._load_epsilon is None:
+            raise ValueError("bounded loads mode is off")
+        self._thaw()
+        share = len(self._nodes_by_data[data]) / len(self._ring)
+        return ceil((1 + self._load_epsilon) * (self._total_load + 1) * share)
+
+    def record_load(self, data: object, amount: int = 1):
+        """
+        Records @amount more load (e.g. requests, connections) on @data, usually the
+        owner |find| just returned. Raises KeyError if @data is not on the ring
+        """
+        self._thaw()
+        if data not in self._nodes_by_data:
+            raise KeyError(data)
+        self._loads[data] = self._loads.get(data, 0) + amount
+        self._total_load += amount
+
+    def release_load(self, data: object, amount: int = 1):
+        """
+        Releases @amount of the load recorded on @data. Raises ValueError if that is
+        more than what is recorded
+        """
+        load = self._loads.get(data, 0)
+        if amount > load:
+            raise ValueError("releasing more load than recorded on {}".format(data))
+
+        if load == amount:
+            del self._loads[data]
+        else:
+            self._loads[data] = load - amount
+        self._total_load -= amount
+
+    def balance(self) -> RingBalance:
+        """
+        How evenly the ring is split: the fraction of RING_SIZE each @data owns, the
+        standard deviation of those fractions and max / avg. Weighted datas are
+        expected to own more, the figures are not normalized by weight.
+        O(N), vectorized with NumPy
+        """
+        starts = self._starts
+        if not starts:
+            return RingBalance(fractions={}, stddev=0.0, max_avg=0.0)
+
+        if self._snapshot is not None:
+            owners = self._snapshot.owners
+            owner_ids = self._snapshot.owner_ids
+        else:
+            owners = list(self._nodes_by_data)
+            index = {data: i for i, data in enumerate(owners)}
+            owner_ids = [index[n.data] for n in self._ring]
+
+        if np is not None:
+            array = np.asarray(starts, dtype=np.int64)
+            # Each node covers up to the next start, the last one wraps around
+            sizes = np.diff(array, append=array[0] + HashRing.RING_SIZE)
+            totals = np.bincount(
+                np.asarray(owner_ids), weights=sizes, minlength=len(owners)
+            ).tolist()
+        else:
+            totals = [0] * len(owners)
+            for i, owner in enumerate(owner_ids):
+                nxt = starts[i + 1] if i + 1 < len(starts) else starts[0]
+                totals[owner] += (nxt - starts[i]) % HashRing.RING_SIZE or (
+                    HashRing.RING_SIZE
                 )
+
+        fractions = {
+            data: total / HashRing.RING_SIZE for data, total in zip(owners, totals)
+        }
+        avg = 1 / len(owners)
+        variance = sum((f - avg) ** 2 for f in fractions.values()) / len(owners)
+        return RingBalance(
+            fractions=fractions,
+            stddev=sqrt(variance),
+            max_avg=max(fractions.values()) / avg,
+        )
+
+    def dry_run_add(
+        self,
+        data: object,
+        hash_generator=None,
+        weight: float = 1,
+        total_bytes: int = None,
+    ) -> ReshardCost:
+        """
+        Cost of |add| with the same parameters (see |reshard_cost| for
+        @total_bytes), without changing the ring. O(K log N) for K new nodes
+        """
+        self._thaw()
+        new_nodes = []
+        try:
+            self._create_nodes(
+                data, range(self._vnode_count(weight)), hash_generator, new_nodes
+            )
+        finally:
+            self._used_starts.difference_update(n.start for n in new_nodes)
+
+        if not self._ring:
+            return reshard_cost([], total_bytes)
+
+        new_nodes.sort(key=attrgetter("start"))
+        starts = self._starts
+        positions = [bisect_left(starts, n.start) for n in new_nodes]
+        moves = []
+        for j, (pos, n) in enumerate(zip(positions, new_nodes)):
+            # The next node once added: the next new one if nothing old lies in
+            # between, else the old node at @pos. Past the end, the first node
+            if j + 1 < len(new_nodes) and positions[j + 1] == pos:
+                end = new_nodes[j + 1].start
+            elif pos < len(starts):
+                end = starts[pos]
             else:
-                # The new node is the last of the list therefore it has the loop where
-                # we need the ranges [start, Range.End] and [0, next_node.start)
+                end = min(new_nodes[0].start, starts[0])
+
+            if end > n.start:
+                ranges = [PartitionRange(start=n.start, count=end - n.start)]
+            else:
+                ranges = [
+                    PartitionRange(start=n.start, count=HashRing.RING_SIZE - n.start),
+                    PartitionRange(start=0, count=end),
+                ]
+            moves.append(
+                ReshardUnit(from_node=self._ring[pos - 1], to_node=n, ranges=ranges)
+            )
+
+        return reshard_cost(moves, total_bytes)
+
+    def dry_run_remove(self, data: object, total_bytes: int = None) -> ReshardCost:
+        """
+        Cost of |remove| (see |reshard_cost| for @total_bytes), without changing the
+        ring. O(K log N) for the K nodes of @data.
+        Raises KeyError if @data is not on the ring.
+        """
+        self._thaw()
+        moves, _ = self._removal_moves(self._nodes_by_data[data])
+        return reshard_cost(moves, total_bytes)
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact binary snapshot of the ring: the sorted uint32 starts, the owner of
+        each node as an index in an interned table of the datas, and the vnode
+        number of each node (so |set_weight| still drops the last ones), followed by
+        the pickled datas table. Loads are not part of it.
+        See |from_bytes| / |from_file|
+        """
+        if self._snapshot is not None:
+            snapshot = self._snapshot
+            starts = snapshot.starts
+            owner_ids = snapshot.owner_ids
+            vnodes = snapshot.vnodes
+            owners = snapshot.owners
+        else:
+            owner_idx = {}
+            vnode_of = {}
+            for i, (data, nodes) in enumerate(self._nodes_by_data.items()):
+                owner_idx[data] = i
+                for v, n in enumerate(nodes):
+                    vnode_of[id(n)] = v
+            owners = list(self._nodes_by_data)
+            starts = array("I", self._starts)
+            owner_ids = array("I", [owner_idx[n.data] for n in self._ring])
+            vnodes = array("I", [vnode_of[id(n)] for n in self._ring])
+
+        meta = pickle.dumps(
+            {"owners": owners, "key_hasher": _hasher_name(self._key_hasher)},
+            pickle.HIGHEST_PROTOCOL,
+        )
+        chunks = [
+            _RingSnapshot.HEADER.pack(
+                _RingSnapshot.MAGIC, len(starts), self.spreading_factor, len(meta)
+            )
+        ]
+        for values in (starts, owner_ids, vnodes):
+            values = array("I", values)
+            if sys.byteorder == "big":
+                values.byteswap()
+            chunks.append(values.tobytes())
+        chunks.append(meta)
+        return b"".join(chunks)
+
+    def save(self, path: str):
+        """
+        Writes |to_bytes| to @path
+        """
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, buffer, key_hasher=blake2b_hash, load_epsilon: float = None):
+        """
+        Ring of a |to_bytes| snapshot. Lookups (|find|, |find_many|,
+        |find_replicas|...) run straight off @buffer's memory without copying the
+        arrays, the ring only turns into regular nodes (O(N)) the first time it
+        changes or tracks loads.
+        @key_hasher must be the one of the saved ring, ValueError otherwise.
+        """
+        snapshot = _RingSnapshot(buffer)
+        if snapshot.key_hasher_name != _hasher_name(key_hasher):
+            raise ValueError(
+                "snapshot was built with {}, not {}".format(
+                    snapshot.key_hasher_name, _hasher_name(key_hasher)
+                )
+            )
+
+        ring = cls(snapshot.spreading_factor, key_hasher, load_epsilon)
+        ring._snapshot = snapshot
+        ring._ring = snapshot
+        ring._starts = snapshot.starts
+        return ring
+
+    @classmethod
+    def from_file(
+        cls, path: str, key_hasher=blake2b_hash, load_epsilon: float = None
+    ):
+        """
+        |from_bytes| over a read-only mmap of the snapshot at @path, so every process
+        loading the same file shares its pages
+        """
+        with open(path, "rb") as f:
+            buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+        return cls.from_bytes(buffer, key_hasher, load_epsilon)
+
+    def _find_bounded(self, idx: int):
+        """
+        First @data not saturated walking clockwise from the node at @idx. Falls back
+        to the node at @idx when all are, which can only happen when more load was
+        recorded than |find| handed out
+        """
+        ring = self._ring
+        saturated = set()
+        for i in range(idx, idx + len(ring)):
+            data = ring[i % len(ring)].data
+            if data in saturated:
+                continue
+            if self._loads.get(data, 0) < self.load_capacity(data):
+                return data
+            saturated.add(data)
+
+        return ring[idx].data
+
+    def _remove_nodes(self, removed: List[RingNode]) -> List[ReshardUnit]:
+        """
+        Unlinks @removed from the ring and returns the moves: each range they covered
+        goes to its closest remaining predecessor
+        """
+        moves, indexes = self._removal_moves(removed)
+
+        # Backwards so the pending indexes stay valid
+        for idx in reversed(indexes):
+            self._used_starts.discard(self._starts[idx])
+            del self._ring[idx]
+            del self._starts[idx]
+        self._invalidate_lookup_tables()
+
+        return moves
+
+    def _removal_moves(self, removed: List[RingNode]):
+        """
+        Moves of unlinking @removed, along with the sorted ring indexes of them. The
+        ring is left as is
+        """
+        removed = sorted(removed, key=attrgetter("start"))
+        removed_ids = set(id(n) for n in removed)
+        indexes = [self._node_idx(n) for n in removed]
+
+        moves = []
+        if len(removed) < len(self._ring):
+            for idx in indexes:
+                # The node covering this range once the removed ones are gone
+                pred_idx = idx - 1
+                while id(self._ring[pred_idx]) in removed_ids:
+                    pred_idx -= 1
+
                 moves.append(
                     ReshardUnit(
-                        from_node=from_node,
-                        to_node=self._ring[left_node_idx],
-                        ranges=[
-                            PartitionRange(
-                                start=self._ring[left_node_idx].start,
-                                count=HashRing.RING_SIZE
-                                - self._ring[left_node_idx].start,
-                            ),
-                            PartitionRange(start=0, count=self._ring[0].start),
-                        ],
+                        from_node=self._ring[idx],
+                        to_node=self._ring[pred_idx],
+                        ranges=self._node_ranges(idx),
                     )
                 )
 
+        return moves, indexes
+
+    def _insert_nodes(self, new_nodes: List[RingNode]) -> List[ReshardUnit]:
+        """
+        Links @new_nodes into the ring and returns the moves: each new node takes the
+        ranges from its start up to the next node, which used to belong to the
+        closest older node counter clockwise.
+        Costs O(K log N) lookups for K new nodes, plus the list shifts or, when K is
+        large, a single O(N + K) splice of the old ring slices. No copy of the
+        previous ring is needed
+        """
+        # By the plain int start, much cheaper than RingNode.__lt__ on big batches
+        new_nodes.sort(key=attrgetter("start"))
+        # Where each new node goes in the ring as it was. The old node right before
+        # that position (the last one for position 0) is the one giving up the ranges
+        positions = [bisect_left(self._starts, n.start) for n in new_nodes]
+        from_nodes = [self._ring[pos - 1] for pos in positions] if self._ring else []
+
+        if len(new_nodes) <= HashRing.MERGE_THRESHOLD:
+            for j, (pos, n) in enumerate(zip(positions, new_nodes)):
+                # Shifted by the j new nodes inserted before it
+                self._ring.insert(pos + j, n)
+                self._starts.insert(pos + j, n.start)
+        else:
+            ring = []
+            starts = []
+            prev = 0
+            for pos, n in zip(positions, new_nodes):
+                ring += self._ring[prev:pos]
+                starts += self._starts[prev:pos]
+                ring.append(n)
+                starts.append(n.start)
+                prev = pos
+            ring += self._ring[prev:]
+            starts += self._starts[prev:]
+            self._ring = ring
+            self._starts = starts
+        self._invalidate_lookup_tables()
+
+        moves = []
+        for j, from_node in enumerate(from_nodes):
+            moves.append(
+                ReshardUnit(
+                    from_node=from_node,
+                    to_node=new_nodes[j],
+                    ranges=self._node_ranges(positions[j] + j),
+                )
+            )
+
         return moves
 
-    def find(self, partition_key: str):
+    def _thaw(self):
+        """
+        Turns a loaded snapshot into the regular, mutable ring structures
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return
+
+        self._ring = [snapshot[i] for i in range(len(snapshot))]
+        self._starts = list(snapshot.starts)
+        self._used_starts = set(self._starts)
+        self._nodes_by_data = {data: [] for data in snapshot.owners}
+        for n, v in sorted(zip(self._ring, snapshot.vnodes), key=lambda nv: nv[1]):
+            self._nodes_by_data[n.data].append(n)
+        self._snapshot = None
+        self._invalidate_lookup_tables()
+
+    def _invalidate_lookup_tables(self):
+        self._np_starts = None
+        self._np_owners = None
+        self._replicas = None
+
+    def _key_positions(self, partition_keys: Iterable[str]):
         """
-        Returns the @data hanging on the node covering the given partition key
+        Index of the node covering each partition key (-1 for the wrap around to the
+        last node). A NumPy array, resolved by a single searchsorted, when NumPy is
+        installed.
+        Hashing the keys is still one call per key, and the bulk of the cost (see
+        |_hash_array|)
         """
-        partition_hash = hash(partition_key) % HashRing.RING_SIZE
-        return HashRing._find_partition(self._ring, partition_hash).data
+        hasher = self._key_hasher
+        if np is None:
+            starts = self._starts
+            return [
+                bisect_right(starts, hasher(k) % HashRing.RING_SIZE) - 1
+                for k in partition_keys
+            ]
+
+        hashes = _hash_array(hasher, partition_keys, HashRing.RING_SIZE)
+        if self._np_starts is None:
+            if self._snapshot is not None:
+                # The snapshot's uint32 starts, zero-copy
+                self._np_starts = np.asarray(self._starts)
+            else:
+                self._np_starts = np.array(self._starts, dtype=np.int64)
+
+        # Hashes are below RING_SIZE so they fit the starts' dtype as well, and
+        # searchsorted doesn't need to convert the whole starts array
+        hashes = hashes.astype(self._np_starts.dtype)
+        return np.searchsorted(self._np_starts, hashes, side="right") - 1
+
+    def _replica_table(self, n: int) -> List[tuple]:
+        """
+        For every node, the first (up to) @n distinct datas clockwise from it, itself
+        first. Cached, a table built for a bigger n serves the smaller ones
+        """
+        if n <= 0:
+            raise ValueError("n must be positive")
+        if self._replicas is not None and self._replicas_n >= n:
+            return self._replicas
+
+        ring = self._ring
+        size = len(ring)
+        table = [None] * size
+        # Backwards: a node's successors are itself and those of the next node. The
+        # first lap only warms up the successors of the nodes wrapping around
+        succ = ()
+        for i in range(2 * size - 1, -1, -1):
+            data = ring[i % size].data
+            if not succ or succ[0] != data:
+                succ = ((data,) + tuple(d for d in succ if d != data))[:n]
+            if i < size:
+                table[i] = succ
+
+        self._replicas = table
+        self._replicas_n = n
+        return table
+
+    def _node_idx(self, node: RingNode) -> int:
+        # Starts are unique on the ring
+        return bisect_left(self._starts, node.start)
+
+    def _node_ranges(self, idx: int) -> List[PartitionRange]:
+        """
+        Ranges covered by the node at @idx: from its start up to the next node's
+        start, looping around the end of the ring for the last node
+        """
+        start = self._ring[idx].start
+        if idx + 1 < len(self._ring):
+            end = self._ring[idx + 1].start
+            return [PartitionRange(start=start, count=end - start)]
+
+        return [
+            PartitionRange(start=start, count=HashRing.RING_SIZE - start),
+            PartitionRange(start=0, count=self._ring[0].start),
+        ]
+
+    def _vnode_count(self, weight: float) -> int:
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        return max(1, round(self.spreading_factor * weight))
+
+    def _create_nodes(
+        self, data: object, vnodes: Iterable[int], hash_generator, out: List[RingNode]
+    ):
+        """
+        Places the @vnodes-th nodes of @data, appending them to @out as they are
+        created. Their starts are reserved right away so nodes of the same batch
+        can't collide, the caller releases them if this raises
+        """
+        for i in vnodes:
+            start = self._create_node_hash(
+                hash_generator or self._node_hash_generator(data, i),
+                self._used_starts,
+            )
+            self._used_starts.add(start)
+            out.append(RingNode(start=start, data=data))
+
+    def _node_hash_generator(self, data: object, vnode: int):
+        """
+        Location generator for the @vnode-th node of @data: the hash of "data#vnode",
+        then of "data#vnode#1", "data#vnode#2"... if the previous ones collide
+        """
+        attempt = 0
+
+        def generator():
+            nonlocal attempt
+            key = "{}#{}".format(data, vnode)
+            if attempt:
+                key += "#{}".format(attempt)
+            attempt += 1
+            return self._key_hasher(key) % HashRing.RING_SIZE
+
+        return generator
 
     @staticmethod
     def _create_node_hash(hash_generator, used_hashes: Set[int]):
@@ -149,13 +924,20 @@ class HashRing(object):
         We need to guarantee that two nodes don't have the exact same hash therefore we
         loop until we create a unique new hash point.
         This could potentially loop for a long time if the ring is too dense, but this is
-        unlikely
+        unlikely. A generator stuck on used hashes (e.g. a constant one used for more
+        than one node) raises ValueError instead of spinning forever
         """
-        while True:
+        for _ in range(HashRing.MAX_HASH_ATTEMPTS):
             h = hash_generator()
             if h not in used_hashes:
                 return h
 
+        raise ValueError(
+            "hash_generator returned {} used hashes in a row".format(
+                HashRing.MAX_HASH_ATTEMPTS
+            )
+        )
+
     @staticmethod
     def _find_partition(ring: List[RingNode], partition_hash: int):
         return ring[HashRing._find_partition_idx(ring, partition_hash)]
@@ -94,6 +94,49 @@ class SentinelDoublyList:
         self._size += 1
         return n
 
+    def extend_left(self, nodes):
+        """
+        Same as calling append_left on each of @nodes, in order, but the head is
+        relinked only once. The last node of @nodes ends up as the head
+        """
+        nxt = self._head.__next
+        for n in nodes:
+            if SentinelDoublyList._is_sentinel(n):
+                raise "TODO Create Exception"
+
+            n.__next = nxt
+            nxt.__prev = n
+            nxt = n
+
+        self._head.__next = nxt
+        nxt.__prev = self._head
+
+        self._size += len(nodes)
+
+    def extend(self, other):
+        """
+        Moves all nodes of the @other list, in order, to the end of this one in O(1).
+        @other is left empty
+        """
+        if other.is_empty():
+            return
+
+        first = other._head.__next
+        last = other._tail.__prev
+
+        ptail = self._tail.__prev
+        ptail.__next = first
+        first.__prev = ptail
+
+        last.__next = self._tail
+        self._tail.__prev = last
+
+        other._head.__next = other._tail
+        other._tail.__prev = other._head
+
+        self._size += other._size
+        other._size = 0
+
     def pop(self):
         if self.is_empty():
             return None
@@ -1,4 +1,5 @@
 import logging
+from threading import Lock
 
 
 def config_logger(log):
@@ -18,3 +19,37 @@ def config_logger(log):
 
 log = logging.getLogger("default")
 config_logger(log)
+
+
+# Stats sources exported by |export_stats|, name -> callable returning a namedtuple
+# snapshot (e.g. a cache's |stats| method)
+_stats_sources = {}
+_stats_lock = Lock()
+
+
+def register_stats(name, source):
+    with _stats_lock:
+        _stats_sources[name] = source
+
+
+def unregister_stats(name):
+    with _stats_lock:
+        _stats_sources.pop(name, None)
+
+
+def export_stats():
+    """
+    Returns {name: {counter: value}} with a fresh snapshot of every registered source
+    """
+    with _stats_lock:
+        sources = list(_stats_sources.items())
+    return {name: source()._asdict() for name, source in sources}
+
+
+def log_stats(logger=log):
+    for name, counters in sorted(export_stats().items()):
+        logger.info(
+            "%s: %s",
+            name,
+            " ".join("{}={}".format(k, v) for k, v in counters.items()),
+        )
@@ -0,0 +1,250 @@
+from collections import namedtuple
+from math import log
+from typing import Iterable, List
+
+from phoenix.hash_ring import _hash_array, blake2b_hash, np
+
+# Share of the key space (0 - 1] going from one data to another. The placement
+# engines below spread keys by hash rather than by ring ranges, so this is their
+# equivalent of a ReshardUnit
+PlacementMove = namedtuple("PlacementMove", ["from_data", "to_data", "fraction"])
+
+_MASK_64 = (1 << 64) - 1
+_JUMP_MULTIPLIER = 2862933555777941757
+
+
+def jump_hash(key: int, num_buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping & Veach): maps the 64 bit @key to a bucket in
+    [0 - @num_buckets). Growing to n + 1 buckets only moves 1 / (n + 1) of the keys,
+    all of them to the new bucket. Returns -1 for no buckets
+    """
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * _JUMP_MULTIPLIER + 1) & _MASK_64
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def _jump_hash_array(keys, num_buckets: int):
+    # jump_hash of every uint64 key at once. Each round moves the keys still
+    # jumping, about ln(num_buckets) rounds in total
+    keys = keys.copy()
+    buckets = np.full(len(keys), -1, dtype=np.int64)
+    jumps = np.zeros(len(keys), dtype=np.int64)
+    active = np.flatnonzero(jumps < num_buckets)
+    while len(active):
+        buckets[active] = jumps[active]
+        keys[active] = keys[active] * np.uint64(_JUMP_MULTIPLIER) + np.uint64(1)
+        jumps[active] = (
+            (buckets[active] + 1)
+            * (float(1 << 31) / ((keys[active] >> np.uint64(33)) + 1).astype(float))
+        ).astype(np.int64)
+        active = active[jumps[active] < num_buckets]
+    return buckets
+
+
+def _mix64(x: int) -> int:
+    # splitmix64 finalizer, spreads the bits of key ^ seed for the rendezvous scores
+    x = (x + 0x9E3779B97F4A7C15) & _MASK_64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return x ^ (x >> 31)
+
+
+def _mix64_array(x):
+    # Same as |_mix64| on a NumPy uint64 array (the multiplications wrap around)
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class JumpHash(object):
+    """
+    Placement engine on top of jump consistent hash. Needs no memory besides the
+    list of datas and spreads the keys perfectly evenly, but datas can only be
+    added at the end: removing any data other than the last one moves the last one
+    into its place. Same interface as HashRing.
+    This class is **NOT** Thread Safe
+    """
+
+    def __init__(self, key_hasher=blake2b_hash):
+        """
+        :key_hasher: int(key)  Hashes the partition keys. Every process sharing the
+                               placement must use the same one
+        """
+        self._key_hasher = key_hasher
+        # Bucket -> data
+        self._datas = []
+        self._buckets = {}
+
+    def add(self, data: object) -> List[PlacementMove]:
+        """
+        Adds @data as the last bucket. Every other data gives it 1 / (n (n + 1)) of
+        the key space, for n datas before the add
+        """
+        if data in self._buckets:
+            raise ValueError("{} is already placed".format(data))
+
+        n = len(self._datas)
+        self._buckets[data] = n
+        self._datas.append(data)
+        return [PlacementMove(d, data, 1 / (n * (n + 1))) for d in self._datas[:-1]]
+
+    def remove(self, data: object) -> List[PlacementMove]:
+        """
+        Removes @data. If it isn't the last bucket, the last data moves into its
+        bucket and so takes its keys, while the keys of the last bucket spread over
+        the others. Raises KeyError if @data is not placed
+        """
+        bucket = self._buckets.pop(data)
+        n = len(self._datas)
+        last = self._datas.pop()
+
+        moves = []
+        if bucket != n - 1:
+            self._datas[bucket] = last
+            self._buckets[last] = bucket
+            moves.append(PlacementMove(data, last, 1 / n))
+        if n > 1:
+            moves.extend(
+                PlacementMove(last, d, 1 / (n * (n - 1)))
+                for d in self._datas
+                if d != last
+            )
+        return moves
+
+    def find(self, partition_key: str):
+        """
+        Returns the @data the given partition key maps to
+        """
+        return self._datas[jump_hash(self._key_hasher(partition_key), len(self._datas))]
+
+    def find_many(self, partition_keys: Iterable[str]) -> List[object]:
+        """
+        Batched |find|. With NumPy installed all the keys jump at once
+        """
+        if np is None:
+            return [self.find(k) for k in partition_keys]
+
+        datas = self._datas
+        buckets = _jump_hash_array(
+            _hash_array(self._key_hasher, partition_keys), len(datas)
+        )
+        return [datas[b] for b in buckets.tolist()]
+
+
+class RendezvousHash(object):
+    """
+    Placement engine on top of (weighted) rendezvous / highest random weight
+    hashing: a key goes to the data scoring highest for it. Adding or removing a
+    data only moves the keys it wins or owned, wherever it is, and weights are
+    exact. Lookups cost O(n) for n datas. Same interface as HashRing.
+    This class is **NOT** Thread Safe
+    """
+
+    def __init__(self, key_hasher=blake2b_hash):
+        """
+        :key_hasher: int(key)  Hashes the partition keys and the datas. Every
+                               process sharing the placement must use the same one
+        """
+        self._key_hasher = key_hasher
+        self._datas = []
+        self._seeds = []
+        self._weights = []
+        # NumPy copies of the seeds / weights for |find_many|. Built on demand and
+        # dropped every time the datas change
+        self._np_seeds = None
+        self._np_weights = None
+
+    def add(self, data: object, weight: float = 1) -> List[PlacementMove]:
+        """
+        Adds @data, owning a share of the keys proportional to its @weight. Each
+        other data gives it the part of its share it loses
+        """
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        if data in self._datas:
+            raise ValueError("{} is already placed".format(data))
+
+        total = sum(self._weights)
+        moves = [
+            PlacementMove(d, data, w * weight / (total * (total + weight)))
+            for d, w in zip(self._datas, self._weights)
+        ]
+
+        self._datas.append(data)
+        self._seeds.append(self._key_hasher(data) & _MASK_64)
+        self._weights.append(weight)
+        self._np_seeds = self._np_weights = None
+        return moves
+
+    def remove(self, data: object) -> List[PlacementMove]:
+        """
+        Removes @data. Its keys spread over the others proportionally to their
+        weights. Raises KeyError if @data is not placed
+        """
+        try:
+            idx = self._datas.index(data)
+        except ValueError:
+            raise KeyError(data)
+
+        total = sum(self._weights)
+        weight = self._weights[idx]
+        del self._datas[idx]
+        del self._seeds[idx]
+        del self._weights[idx]
+        self._np_seeds = self._np_weights = None
+
+        if not self._datas:
+            return []
+        return [
+            PlacementMove(data, d, (weight / total) * w / (total - weight))
+            for d, w in zip(self._datas, self._weights)
+        ]
+
+    def find(self, partition_key: str):
+        """
+        Returns the @data scoring highest for the given partition key
+        """
+        h = self._key_hasher(partition_key) & _MASK_64
+        best, best_score = None, -1.0
+        for data, seed, weight in zip(self._datas, self._seeds, self._weights):
+            # Uniform in (0, 1) from the top 53 bits. -weight / ln(u) is the
+            # weighted score: each data wins with probability weight / total
+            u = ((_mix64(h ^ seed) >> 11) + 0.5) / (1 << 53)
+            score = -weight / log(u)
+            if score > best_score:
+                best, best_score = data, score
+
+        if best is None:
+            raise IndexError("no data placed")
+        return best
+
+    def find_many(self, partition_keys: Iterable[str]) -> List[object]:
+        """
+        Batched |find|. With NumPy installed the scores of a chunk of keys against
+        every data are computed at once
+        """
+        if np is None:
+            return [self.find(k) for k in partition_keys]
+        if not self._datas:
+            raise IndexError("no data placed")
+
+        if self._np_seeds is None:
+            self._np_seeds = np.array(self._seeds, dtype=np.uint64)
+            self._np_weights = np.array(self._weights, dtype=float)
+
+        hashes = _hash_array(self._key_hasher, partition_keys)
+        # Keeps the (keys x datas) score matrices around 1M entries
+        chunk = max(1, (1 << 20) // len(self._datas))
+        winners = []
+        for i in range(0, len(hashes), chunk):
+            mixed = _mix64_array(hashes[i : i + chunk, None] ^ self._np_seeds)
+            u = ((mixed >> np.uint64(11)).astype(float) + 0.5) / float(1 << 53)
+            winners.extend(np.argmax(-self._np_weights / np.log(u), axis=1).tolist())
+
+        datas = self._datas
+        return [datas[w] for w in winners]
@@ -0,0 +1,273 @@
+import os
+import pickle
+import shutil
+from collections import namedtuple
+from mmap import mmap
+from tempfile import mkdtemp
+from threading import RLock
+from phoenix.cache import LRUCache, EVICTED_EXPIRED
+from phoenix.workflow import Workflow
+
+TieredStats = namedtuple(
+    "TieredStats", ["hits", "disk_hits", "misses", "spills", "compactions"]
+)
+
+# Where a spilled value lives
+DiskEntry = namedtuple("DiskEntry", ["segment", "offset", "length", "pickled"])
+
+
+class Segment(object):
+    """
+    Append-only file of @size bytes, memory mapped. Records are raw byte blobs, the
+    owner keeps the (offset, length) of each one. Once full the segment is sealed,
+    its bytes only become garbage as the entries living in it die.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        # Keys of the live records, the ones compaction has to carry over
+        self.keys = set()
+        self.live_bytes = 0
+        self._write_offset = 0
+
+        self._file = open(path, "w+b")
+        self._file.truncate(size)
+        self._mm = mmap(self._file.fileno(), size)
+
+    @property
+    def used_bytes(self):
+        return self._write_offset
+
+    def append(self, data):
+        """
+        Writes @data and returns its offset, or |None| if it doesn't fit
+        """
+        offset = self._write_offset
+        if offset + len(data) > self.size:
+            return None
+
+        self._mm[offset : offset + len(data)] = data
+        self._write_offset += len(data)
+        return offset
+
+    def read(self, offset, length):
+        return self._mm[offset : offset + length]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+        os.remove(self.path)
+
+
+class TieredCache(object):
+    """
+    Two tier cache. The hot tier is a LRUCache; entries it evicts for lack of room
+    are spilled (pickled, or as is for bytes) into append-only memory mapped
+    Segment files instead of being lost, with an in-memory index of their offsets.
+    A |get| missing on the hot tier promotes the value back from disk.
+
+    Every key lives in exactly one tier. Overwritten and promoted values leave dead
+    bytes behind, |compact| rewrites the live records of mostly dead segments into
+    the active one and deletes their files. CompactionWorkflow runs it in the
+    background on a WorkflowEngine.
+    The disk tier is a spill area, not a persistent store: |close| removes it, and
+    the cache can't be used anymore afterwards.
+    This class is Thread Safe
+    """
+
+    def __init__(
+        self, capacity, directory=None, segment_size=64 * 1024 * 1024, compact_ratio=0.5
+    ):
+        """
+        :capacity:       Max number of entries in the hot tier
+        :directory:      Where the segment files go. A temporary one if not given
+        :segment_size:   Size, in bytes, of each segment file
+        :compact_ratio:  Sealed segments with less than this fraction of live bytes
+                         get compacted
+        """
+        self._lock = RLock()
+        self._hot = LRUCache(capacity, on_evict=self._spill)
+        self._index = {}
+
+        # A temporary directory is ours to delete on |close|, a given one is not
+        self._owns_directory = directory is None
+        self._directory = directory or mkdtemp(prefix="phoenix_tiered_")
+        os.makedirs(self._directory, exist_ok=True)
+        self._segment_size = segment_size
+        self._compact_ratio = compact_ratio
+        self._segments = []
+        self._next_segment_id = 0
+        self._active = self._new_segment(segment_size)
+
+        # hits, disk_hits, misses, spills, compactions
+        self._counters = [0, 0, 0, 0, 0]
+        self._closed = False
+
+    @property
+    def capacity(self):
+        """
+        Getter
+        """
+        return self._hot.capacity
+
+    def put(self, key, val):
+        with self._lock:
+            self._check_open()
+            # The disk copy, if any, is stale now
+            self._discard(key)
+            self._hot.put(key, val)
+
+    def get(self, key):
+        """
+        Gets the value associated with @key, promoting it to the hot tier if it was
+        spilled. If key is not present, returns |None|
+        """
+        with self._lock:
+            self._check_open()
+            val = self._hot.get(key)
+            if val is not None:
+                self._counters[0] += 1
+                return val
+
+            entry = self._index.get(key)
+            if entry is None:
+                self._counters[2] += 1
+                return None
+
+            data = entry.segment.read(entry.offset, entry.length)
+            val = pickle.loads(data) if entry.pickled else data
+            self._discard(key)
+            # May spill the hot tier's oldest entry in its place
+            self._hot.put(key, val)
+            self._counters[1] += 1
+            return val
+
+    def disk_size(self):
+        """
+        Number of entries living in the disk tier
+        """
+        with self._lock:
+            return len(self._index)
+
+    def stats(self):
+        with self._lock:
+            return TieredStats(*self._counters)
+
+    def compact(self):
+        """
+        Rewrites the live records of every sealed segment whose live bytes dropped
+        below @compact_ratio and deletes it, along with the sealed segments left with
+        no live bytes at all. Returns the number of segments deleted
+        """
+        with self._lock:
+            self._check_open()
+            dead = [
+                s
+                for s in self._segments
+                if s is not self._active
+                and (
+                    s.live_bytes == 0
+                    or s.live_bytes < self._compact_ratio * s.used_bytes
+                )
+            ]
+
+            for segment in dead:
+                for key in list(segment.keys):
+                    entry = self._index[key]
+                    data = segment.read(entry.offset, entry.length)
+                    self._write(key, data, entry.pickled)
+
+                self._segments.remove(segment)
+                segment.close()
+
+            self._counters[4] += len(dead)
+            return len(dead)
+
+    def close(self):
+        """
+        Drops the disk tier and its files, along with the directory if it was a
+        temporary one. Any later |put| / |get| / |compact| raises ValueError
+        """
+        with self._lock:
+            if self._closed:
+                return
+
+            self._closed = True
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+            self._index = {}
+            if self._owns_directory:
+                shutil.rmtree(self._directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _check_open(self):
+        if self._closed:
+            raise ValueError("TieredCache is closed")
+
+    def _spill(self, key, val, reason):
+        # Called by the hot tier, under our lock, right after it evicted @key
+        if reason == EVICTED_EXPIRED:
+            return
+
+        if isinstance(val, bytes):
+            self._write(key, val, pickled=False)
+        else:
+            self._write(key, pickle.dumps(val, pickle.HIGHEST_PROTOCOL), pickled=True)
+        self._counters[3] += 1
+
+    def _write(self, key, data, pickled):
+        self._discard(key)
+
+        if len(data) > self._segment_size:
+            # Gets a sealed segment of its own, the active one keeps filling up
+            segment = self._new_segment(len(data))
+        else:
+            segment = self._active
+            if segment.used_bytes + len(data) > segment.size:
+                # Seals the active segment
+                segment = self._active = self._new_segment(self._segment_size)
+
+        offset = segment.append(data)
+        segment.keys.add(key)
+        segment.live_bytes += len(data)
+        self._index[key] = DiskEntry(segment, offset, len(data), pickled)
+
+    def _discard(self, key):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            entry.segment.keys.discard(key)
+            entry.segment.live_bytes -= entry.length
+
+    def _new_segment(self, size):
+        path = os.path.join(
+            self._directory, "segment_{:06d}.dat".format(self._next_segment_id)
+        )
+        self._next_segment_id += 1
+        segment = Segment(path, size)
+        self._segments.append(segment)
+        return segment
+
+
+class CompactionWorkflow(Workflow):
+    """
+    Workflow that periodically compacts a TieredCache when it runs on a
+    WorkflowEngine
+    """
+
+    def __init__(self, cache, interval_secs=10.0):
+        self._cache = cache
+        self._interval_secs = interval_secs
+
+    def run_step(self):
+        self._cache.compact()
+        return self._interval_secs
+
+    def on_early_stop(self):
+        pass
@@ -0,0 +1,110 @@
+from math import ceil
+from phoenix.lists import SentinelDoublyList
+
+
+class TimerWheel(object):
+    """
+    Hashed timer wheel. Time is split into ticks of @resolution seconds and each tick
+    is mapped into one of @slots buckets (tick % slots). Deadlines farther than one
+    lap away share the bucket with nearer ones and are simply skipped until their
+    tick comes.
+
+    schedule / reschedule / cancel are O(1). advance only visits the buckets of the
+    ticks elapsed since the last call, never the whole set of timers (unless more
+    than a full lap went by).
+    This class is **NOT** Thread Safe
+    """
+
+    class TimerEntry(object):
+        """
+        Handle returned by |schedule|. Lives in exactly one bucket list
+        """
+        def __init__(self, item, deadline, tick):
+            self.item = item
+            self.deadline = deadline
+            self.tick = tick
+            self.bucket = None
+
+    def __init__(self, now, resolution=1.0, slots=512):
+        if resolution <= 0 or slots <= 0:
+            raise ValueError("resolution and slots must be positive")
+
+        self._resolution = resolution
+        self._buckets = [SentinelDoublyList() for _ in range(slots)]
+        # Last tick processed by |advance|. Everything on or before it has fired
+        self._tick = self._to_tick(now)
+        self._size = 0
+
+    def size(self):
+        return self._size
+
+    def schedule(self, item, deadline):
+        """
+        Schedules @item to be returned by |advance| once the clock passes @deadline
+        """
+        entry = TimerWheel.TimerEntry(item, deadline, self._deadline_tick(deadline))
+        self._link(entry)
+        return entry
+
+    def reschedule(self, entry, deadline):
+        """
+        Moves an already scheduled @entry to the new @deadline
+        """
+        tick = self._deadline_tick(deadline)
+        entry.deadline = deadline
+        if tick == entry.tick:
+            return entry
+
+        self._unlink(entry)
+        entry.tick = tick
+        self._link(entry)
+        return entry
+
+    def cancel(self, entry):
+        if entry.bucket is not None:
+            self._unlink(entry)
+
+    def advance(self, now):
+        """
+        Moves the wheel up to @now and returns the items of all timers that fired.
+        Fired entries are removed from the wheel
+        """
+        target = self._to_tick(now)
+        if target <= self._tick:
+            return []
+
+        fired = []
+        slots = len(self._buckets)
+        # After a full lap every bucket must be visited exactly once, there is no
+        # point in going around more than that
+        first = max(self._tick + 1, target - slots + 1)
+        for tick in range(first, target + 1):
+            bucket = self._buckets[tick % slots]
+            entry = bucket.head()
+            while entry is not None:
+                nxt = bucket.next(entry)
+                if entry.tick <= target:
+                    self._unlink(entry)
+                    fired.append(entry.item)
+                entry = nxt
+
+        self._tick = target
+        return fired
+
+    def _to_tick(self, t):
+        return int(t // self._resolution)
+
+    def _deadline_tick(self, deadline):
+        # Timers never fire early: a deadline in the middle of a tick goes to the
+        # next one. Deadlines already in the past fire on the next advance
+        return max(int(ceil(deadline / self._resolution)), self._tick + 1)
+
+    def _link(self, entry):
+        entry.bucket = self._buckets[entry.tick % len(self._buckets)]
+        entry.bucket.append(entry)
+        self._size += 1
+
+    def _unlink(self, entry):
+        entry.bucket.unlink(entry)
+        entry.bucket = None
+        self._size -= 1
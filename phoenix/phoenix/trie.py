@@ -1,23 +1,141 @@
+import gc
+import pickle
+import sys
+from array import array
+from bisect import bisect_left
+from heapq import heappop, heappush
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+
+# Best score of a subtree without words
+_NO_SCORE = float("-inf")
+
+
 class CompressedTrieNode:
-    def __init__(self, is_end):
+    def __init__(self, is_end, value=None, score=0):
         self.children = {}
         self.edges = {}
         self.is_end = is_end
+        self.value = value
+        self.score = score if is_end else None
+        # Number of words ending in this node's subtree, itself included
+        self.count = 1 if is_end else 0
+        # Highest score of the words in this node's subtree, itself included
+        self.best = score if is_end else _NO_SCORE
 
 
 class CompressedTrie:
     def __init__(self):
         self.root = CompressedTrieNode(is_end=False)
 
-    def insert(self, word):
+    def __len__(self):
+        return self.root.count
+
+    @classmethod
+    def from_sorted(cls, items, pause_gc=False):
+        """
+        Builds a trie in a single pass over @items: words in lexicographic order, or
+        (word, value[, score]) tuples sorted by word. Each word only compares with
+        the previous one: the nodes past their longest common prefix are done, and
+        at most one edge is split to branch off the new word. Repeated words keep
+        their last value and score. Raises ValueError if @items aren't sorted.
+        :pause_gc:  Disables the cyclic garbage collector during the build, for the
+                    whole process. The trie has no cycles, and collections
+                    triggered by the new nodes can double the build time
+        """
+        if not pause_gc:
+            return cls._build_sorted(items)
+
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return cls._build_sorted(items)
+        finally:
+            if enabled:
+                gc.enable()
+
+    @classmethod
+    def _build_sorted(cls, items):
+        # See |from_sorted|
+        trie = cls()
+        # Rightmost path of the trie as (node, length of its path)
+        stack = [(trie.root, 0)]
+        prev = None
+
+        for item in items:
+            if isinstance(item, str):
+                word, value, score = item, None, 0
+            else:
+                word, value, *rest = item
+                score = rest[0] if rest else 0
+
+            if prev is None:
+                lcp = 0
+            elif word <= prev:
+                if word != prev:
+                    raise ValueError("{!r} sorts before {!r}".format(word, prev))
+                node = stack[-1][0]
+                node.value, node.score, node.best = value, score, score
+                continue
+            else:
+                lcp = 0
+                n = min(len(word), len(prev))
+                while lcp < n and word[lcp] == prev[lcp]:
+                    lcp += 1
+            prev = word
+
+            # Nodes deeper than the common prefix get no more words
+            last = None
+            while stack[-1][1] > lcp:
+                last = stack.pop()[0]
+                # Leaves are born finished
+                if last.children:
+                    cls._finish(last)
+
+            parent, depth = stack[-1]
+            if depth < lcp:
+                # The common prefix ends halfway through the edge to |last|
+                key = word[depth]
+                label = parent.edges[key]
+                split = CompressedTrieNode(is_end=False)
+                parent.edges[key] = label[: lcp - depth]
+                parent.children[key] = split
+                split.edges[label[lcp - depth]] = label[lcp - depth :]
+                split.children[label[lcp - depth]] = last
+                stack.append((split, lcp))
+                parent = split
+
+            if lcp == len(word):
+                # Only the empty word, first of all
+                parent.is_end, parent.value, parent.score = True, value, score
+                continue
+
+            leaf = CompressedTrieNode(True, value, score)
+            parent.edges[word[lcp]] = word[lcp:]
+            parent.children[word[lcp]] = leaf
+            stack.append((leaf, len(word)))
+
+        while stack:
+            cls._finish(stack.pop()[0])
+        return trie
+
+    def insert(self, word, value=None, score=0):
+        """
+        Adds @word with its @value and @score (see |top_k|). Inserting a word again
+        replaces both
+        """
         current_node = self.root
+        # Nodes whose subtree gains @word, if it is new
+        path = [current_node]
         i = 0
 
         while i < len(word):
             if word[i] not in current_node.edges:
                 # Case 1: No path starting with that letter (New)
                 current_node.edges[word[i]] = word[i:]
-                current_node.children[word[i]] = CompressedTrieNode(is_end=True)
+                current_node.children[word[i]] = CompressedTrieNode(True, value, score)
+                self._grow(path, score)
+                return
 
             else:
                 idx = i
@@ -35,12 +153,13 @@ class CompressedTrie:
                     #     j   idx   i
 
                     current_node = current_node.children[word[idx]]
+                    path.append(current_node)
                     if i == len(word):
                         # Case 3: Label and word are the same
                         # face      face
                         #     ^     ^   ^
                         #     j   idx   i
-                        current_node.is_end = True
+                        self._mark_end(current_node, value, score, path)
                         return
                 else:
                     if i == len(word):
@@ -52,7 +171,9 @@ class CompressedTrie:
                         #     j       idx   i
 
                         existing = current_node.children[word[idx]]
-                        new_child = CompressedTrieNode(is_end=True)
+                        new_child = CompressedTrieNode(True, value, score)
+                        new_child.count += existing.count
+                        new_child.best = max(score, existing.best)
 
                         # Adding "face" edge to current node
                         current_node.edges[word[idx]] = word[idx:]
@@ -71,6 +192,8 @@ class CompressedTrie:
 
                         existing = current_node.children[word[idx]]
                         new_child = CompressedTrieNode(is_end=False)
+                        new_child.count = existing.count + 1
+                        new_child.best = max(score, existing.best)
 
                         # Adding "fac" edge to current node
                         current_node.edges[word[idx]] = word[idx:i]
@@ -82,63 +205,196 @@ class CompressedTrie:
 
                         # Adding "ing" to new child
                         new_child.edges[word[i]] = word[i:]
-                        new_child.children[word[i]] = CompressedTrieNode(is_end=True)
+                        new_child.children[word[i]] = CompressedTrieNode(
+                            True, value, score
+                        )
+                    self._grow(path, score)
                     return
 
+        # Only the empty word gets here
+        self._mark_end(current_node, value, score, path)
+
     def search(self, word):
+        node = self._find_node(word)
+        return node is not None and node.is_end
+
+    def get(self, word, default=None):
+        """
+        Value of @word, or @default if it isn't in the trie
+        """
+        node = self._find_node(word)
+        if node is None or not node.is_end:
+            return default
+        return node.value
+
+    def get_score(self, word, default=None):
+        """
+        Score of @word, or @default if it isn't in the trie
+        """
+        node = self._find_node(word)
+        if node is None or not node.is_end:
+            return default
+        return node.score
+
+    def set_score(self, word, score):
+        """
+        Changes the score of @word, returning whether it was in the trie. The best
+        scores cached along its path are updated, O(depth * children)
+        """
+        nodes = self._node_path(word)
+        if nodes is None or not nodes[-1].is_end:
+            return False
+
+        nodes[-1].score = score
+        self._refresh_best(nodes)
+        return True
+
+    def top_k(self, prefix, k):
+        """
+        The @k highest scored words starting with @prefix, as (word, score) pairs
+        from the best down (ties in lexicographic order).
+        Best-first search on the best score cached in every node: only the nodes
+        holding one of the results, and their siblings, are ever looked at
+        """
+        node, path = self._locate(prefix)
+        if node is None or k <= 0:
+            return []
+
+        result = []
+        # (-score, path, kind, node). Kind 0 are words, 1 subtrees to expand. A
+        # subtree's path sorts before all its words, so ties pop in order
+        heap = [(-node.best, path, 1, node)]
+        while heap and len(result) < k:
+            score, path, kind, node = heappop(heap)
+            if kind == 0:
+                result.append((path, -score))
+                continue
+
+            if node.is_end:
+                heappush(heap, (-node.score, path, 0, node))
+            for key, child in node.children.items():
+                if child.best != _NO_SCORE:
+                    heappush(heap, (-child.best, path + node.edges[key], 1, child))
+
+        return result
+
+    def delete(self, word):
+        """
+        Removes @word, returning whether it was in the trie. Nodes left without a
+        word and with a single child are merged into their parent edge, so the trie
+        stays as compressed as if @word had never been inserted
+        """
+        # (parent, first letter of the edge) of every node down to @word's
+        path = []
         current_node = self.root
         i = 0
-
         while i < len(word):
-            if word[i] not in current_node.edges:
-                # Case 1: No path starting with that letter (New)
+            label = current_node.edges.get(word[i])
+            if label is None or not word.startswith(label, i):
                 return False
+            path.append((current_node, word[i]))
+            current_node = current_node.children[word[i]]
+            i += len(label)
 
-            else:
-                idx = i
-                j = 0
-                label = current_node.edges[word[i]]
-                while j < len(label) and i < len(word) and word[i] == label[j]:
-                    j += 1
-                    i += 1
+        if not current_node.is_end:
+            return False
 
-                if j == len(label):
-                    # Case 2: label is at least a prefix for the word
-                    # E.g. label=face, word=facebook
-                    # face      facebook
-                    #     ^     ^   ^
-                    #     j   idx   i
-                    current_node = current_node.children[word[idx]]
-                    if i == len(word):
-                        # Case 3: label == word
-                        # face      face
-                        #     ^     ^   ^
-                        #     j   idx   i
-                        return current_node.is_end
+        # Still referenced once the fixes below reshape the path
+        nodes = [self.root] + [parent.children[key] for parent, key in path]
+        current_node.is_end = False
+        current_node.value = None
+        current_node.score = None
+        self.root.count -= 1
+        for parent, key in path:
+            parent.children[key].count -= 1
 
-                else:
-                    return False
+        if path and not current_node.children:
+            # Leaf: goes away, which may leave its parent with a single child
+            parent, key = path.pop()
+            del parent.edges[key]
+            del parent.children[key]
+            current_node = parent
+        if path and not current_node.is_end and len(current_node.children) == 1:
+            parent, key = path[-1]
+            (child_key,) = current_node.children
+            parent.edges[key] += current_node.edges[child_key]
+            parent.children[key] = current_node.children[child_key]
 
-    def starts_with(self, word):
-        ans = []
+        # Nodes gone from the trie get refreshed too, it doesn't matter
+        self._refresh_best(nodes)
+        return True
 
-        def _all_under(node, path):
-            nonlocal ans
+    def freeze(self):
+        """
+        Read-only, array-packed copy of the trie (see |FrozenTrie|), e.g. to
+        |FrozenTrie.save| it and share it between processes with
+        |FrozenTrie.from_file|
+        """
+        # Breadth first, so the children of every node are consecutive
+        nodes = [self.root]
+        labels = [""]
+        first_child = array("I")
+        for node in nodes:
+            first_child.append(len(nodes))
+            for key in sorted(node.children):
+                nodes.append(node.children[key])
+                labels.append(node.edges[key])
+        first_child.append(len(nodes))
+
+        label_offsets = array("I", [0])
+        chars = array("I")
+        blob = []
+        offset = 0
+        for label in labels:
+            encoded = label.encode("utf-8")
+            blob.append(encoded)
+            offset += len(encoded)
+            label_offsets.append(offset)
+            chars.append(ord(label[0]) if label else 0)
+
+        word_ids = array("I")
+        values = []
+        for node in nodes:
             if node.is_end:
-                ans.append(path)
+                word_ids.append(len(values))
+                values.append(node.value)
+            else:
+                word_ids.append(FrozenTrie.NO_WORD)
 
-            for key, next_node in node.children.items():
-                _all_under(next_node, path + node.edges[key])
+        return FrozenTrie.from_bytes(
+            FrozenTrie._pack(
+                scores=array("d", [n.score if n.is_end else _NO_SCORE for n in nodes]),
+                best=array("d", [n.best for n in nodes]),
+                counts=array("I", [n.count for n in nodes]),
+                chars=chars,
+                word_ids=word_ids,
+                first_child=first_child,
+                label_offsets=label_offsets,
+                blob=b"".join(blob),
+                values=values,
+            )
+        )
 
-            return ans
+    def count_prefix(self, word):
+        """
+        Number of words starting with @word, in O(len(word)) thanks to the
+        per-node counts
+        """
+        node, _ = self._locate(word)
+        return 0 if node is None else node.count
 
+    def _find_node(self, word):
+        """
+        Node in which @word ends, if the trie has a path for it ending exactly at a
+        node (whether a word ends there or not)
+        """
         current_node = self.root
         i = 0
 
         while i < len(word):
             if word[i] not in current_node.edges:
                 # Case 1: No path starting with that letter (New)
-                return []
+                return None
 
             else:
                 idx = i
@@ -155,33 +411,160 @@ class CompressedTrie:
                     #     ^     ^   ^
                     #     j   idx   i
                     current_node = current_node.children[word[idx]]
-                    if i == len(word):
-                        # Case 3: label == word
-                        # face      face
-                        #     ^     ^   ^
-                        #     j   idx   i
-                        return _all_under(current_node, word)
 
                 else:
-                    if i == len(word):
-                        # Case 4: word is a prefix of the label
-                        # E.g. label=facebook, word=face
-                        # State:
-                        # facebook      face
-                        #     ^         ^   ^
-                        #     j       idx   i
-                        return _all_under(
-                            current_node.children[word[idx]], word + label[j:]
-                        )
-                    else:
-                        # Case 5: word is partial match of label.
-                        # E.g. label=facebook, word=facing
-                        # State:
-                        # facebook      facing
-                        #    ^          ^  ^
-                        #    j        idx  i
+                    return None
+
+        # Case 3: label == word
+        # face      face
+        #     ^     ^   ^
+        #     j   idx   i
+        return current_node
+
+    def _locate(self, prefix):
+        """
+        Node heading the subtree of the words starting with @prefix, along with the
+        path to it: @prefix, plus the rest of the label when @prefix ends halfway
+        through one. (None, None) if no word starts with @prefix
+        """
+        current_node = self.root
+        i = 0
+        while i < len(prefix):
+            label = current_node.edges.get(prefix[i])
+            if label is None:
+                return None, None
+
+            # Compares what is left of @prefix and the label over their common length
+            n = min(len(label), len(prefix) - i)
+            if prefix[i : i + n] != label[:n]:
+                return None, None
+            current_node = current_node.children[prefix[i]]
+            i += n
+
+            if n < len(label):
+                return current_node, prefix + label[n:]
+        return current_node, prefix
+
+    def _node_path(self, word):
+        """
+        Nodes from the root down to the one @word ends in, or None (see
+        |_find_node|)
+        """
+        nodes = [self.root]
+        i = 0
+        while i < len(word):
+            label = nodes[-1].edges.get(word[i])
+            if label is None or not word.startswith(label, i):
+                return None
+            nodes.append(nodes[-1].children[word[i]])
+            i += len(label)
+        return nodes
+
+    def _mark_end(self, node, value, score, path):
+        # @word ends at the existing @node, reached through @path
+        node.value = value
+        if not node.is_end:
+            node.is_end = True
+            node.score = score
+            self._grow(path, score)
+        elif score >= node.score:
+            node.score = score
+            for n in path:
+                n.best = max(n.best, score)
+        else:
+            # May have been the best of the nodes above
+            node.score = score
+            self._refresh_best(path)
+
+    @staticmethod
+    def _grow(path, score):
+        # A new word with @score under every node of @path
+        for node in path:
+            node.count += 1
+            if score > node.best:
+                node.best = score
 
-                        return []
+    @staticmethod
+    def _finish(node):
+        # Count and best score of @node, once its children are all finished
+        count = 1 if node.is_end else 0
+        best = node.score if node.is_end else _NO_SCORE
+        for child in node.children.values():
+            count += child.count
+            if child.best > best:
+                best = child.best
+        node.count = count
+        node.best = best
+
+    @staticmethod
+    def _refresh_best(nodes):
+        # Recomputes the best score of @nodes, a path from the top down
+        for node in reversed(nodes):
+            best = node.score if node.is_end else _NO_SCORE
+            for child in node.children.values():
+                if child.best > best:
+                    best = child.best
+            node.best = best
+
+    def starts_with(self, word):
+        return list(self.iter_prefix(word))
+
+    def iter_prefix(self, prefix, limit=None, start_after=None):
+        """
+        Yields the words starting with @prefix in lexicographic order, lazily so the
+        caller can stop at any time. At most @limit of them, and only those after
+        @start_after (e.g. the last one of the previous page).
+        Walks an explicit stack, so it doesn't hit the recursion limit, and builds
+        each word from the edge labels on the stack only when yielding it
+        """
+        node, path = self._locate(prefix)
+        if node is None or limit == 0:
+            return
+
+        # While a node lies on the path to @start_after, its children sorting
+        # before it are skipped and the ones sharing its path must be compared too
+        seeking = False
+        if start_after is not None:
+            if start_after.startswith(path):
+                seeking = True
+            elif path < start_after:
+                return
+
+        found = 0
+        if node.is_end and not seeking:
+            yield path
+            found += 1
+            if found == limit:
+                return
+
+        labels = [path]
+        stack = [(node, iter(sorted(node.children)), seeking)]
+        while stack:
+            node, keys, seeking = stack[-1]
+            key = next(keys, None)
+            if key is None:
+                stack.pop()
+                labels.pop()
+                continue
+
+            label = node.edges[key]
+            child = node.children[key]
+            child_seeking = False
+            if seeking:
+                child_path = "".join(labels) + label
+                if start_after.startswith(child_path):
+                    child_seeking = True
+                elif child_path < start_after:
+                    continue
+
+            labels.append(label)
+            # A word on the path to @start_after is a prefix of it, so not after it
+            if child.is_end and not child_seeking:
+                yield "".join(labels)
+                found += 1
+                if found == limit:
+                    return
+            stack.append((child, iter(sorted(child.children)), child_seeking))
 
     def print_trie(self):
         def _print_trie(node, level):
@@ -194,3 +577,295 @@ class CompressedTrie:
                 _print_trie(node.children[i], level + 1)
 
         _print_trie(self.root, 0)
+
+
+def _array_view(buffer, offset, typecode, count):
+    # Zero-copy on little endian machines, the byte order of the frozen tries
+    size = array(typecode).itemsize
+    view = memoryview(buffer)[offset : offset + size * count].cast(typecode)
+    if sys.byteorder == "big":
+        view = array(typecode, view)
+        view.byteswap()
+    return view
+
+
+class FrozenTrie:
+    """
+    Read-only CompressedTrie packed in flat arrays, built by
+    |CompressedTrie.freeze|. Nodes are numbered breadth first, so the children of
+    a node are a range of numbers, sorted by the first character of their edge
+    label and searched by bisection. The labels are UTF-8 in a single blob.
+    The arrays are views over the trie's own memory (e.g. a mmap of a file shared
+    by every process), only the values are unpickled on load. Scores come back as
+    floats.
+    This class is **NOT** Thread Safe
+    """
+
+    # magic, nodes, words, length of the label blob, length of the pickled meta
+    HEADER = Struct("<8sIIQQ")
+    MAGIC = b"PHXTRIE1"
+    # Word id of the nodes no word ends in
+    NO_WORD = 0xFFFFFFFF
+
+    def __init__(self, buffer):
+        """
+        See |from_bytes|
+        """
+        magic, count, self._words, blob_len, meta_len = self.HEADER.unpack_from(
+            buffer
+        )
+        if magic != self.MAGIC:
+            raise ValueError("not a FrozenTrie")
+
+        # Keeps the mmap alive as long as the views over it
+        self._buffer = buffer
+        offset = self.HEADER.size
+        # Doubles first, they stay 8 bytes aligned after the header
+        self._scores = _array_view(buffer, offset, "d", count)
+        self._best = _array_view(buffer, offset + 8 * count, "d", count)
+        offset += 16 * count
+        self._counts = _array_view(buffer, offset, "I", count)
+        self._chars = _array_view(buffer, offset + 4 * count, "I", count)
+        self._word_ids = _array_view(buffer, offset + 8 * count, "I", count)
+        offset += 12 * count
+        self._first_child = _array_view(buffer, offset, "I", count + 1)
+        self._label_offsets = _array_view(
+            buffer, offset + 4 * (count + 1), "I", count + 1
+        )
+        offset += 8 * (count + 1)
+        self._blob = memoryview(buffer)[offset : offset + blob_len]
+        offset += blob_len
+        self._values = pickle.loads(buffer[offset : offset + meta_len])["values"]
+
+    @staticmethod
+    def _pack(
+        scores,
+        best,
+        counts,
+        chars,
+        word_ids,
+        first_child,
+        label_offsets,
+        blob,
+        values,
+    ):
+        # Layout read back by |__init__|
+        if all(v is None for v in values):
+            values = None
+        meta = pickle.dumps({"values": values}, pickle.HIGHEST_PROTOCOL)
+        words = len(counts) - word_ids.count(FrozenTrie.NO_WORD)
+        chunks = [
+            FrozenTrie.HEADER.pack(
+                FrozenTrie.MAGIC, len(counts), words, len(blob), len(meta)
+            )
+        ]
+        for column in (
+            scores,
+            best,
+            counts,
+            chars,
+            word_ids,
+            first_child,
+            label_offsets,
+        ):
+            if sys.byteorder == "big":
+                column = array(column.typecode, column)
+                column.byteswap()
+            chunks.append(column.tobytes())
+        chunks.append(blob)
+        chunks.append(meta)
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        """
+        Trie of a |to_bytes| image, running straight off @buffer's memory
+        """
+        return cls(buffer)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        |from_bytes| over a read-only mmap of the file at @path, so every process
+        loading the same file shares its pages
+        """
+        with open(path, "rb") as f:
+            buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+        return cls.from_bytes(buffer)
+
+    def to_bytes(self):
+        """
+        Binary image of the trie: header, node arrays, label blob and pickled values
+        """
+        return bytes(self._buffer)
+
+    def save(self, path):
+        """
+        Writes |to_bytes| to @path
+        """
+        with open(path, "wb") as f:
+            f.write(self._buffer)
+
+    def __len__(self):
+        return self._words
+
+    def search(self, word):
+        node = self._find_node(word)
+        return node >= 0 and self._word_ids[node] != self.NO_WORD
+
+    def get(self, word, default=None):
+        """
+        Value of @word, or @default if it isn't in the trie
+        """
+        node = self._find_node(word)
+        if node < 0 or self._word_ids[node] == self.NO_WORD:
+            return default
+        return None if self._values is None else self._values[self._word_ids[node]]
+
+    def get_score(self, word, default=None):
+        """
+        Score of @word, or @default if it isn't in the trie
+        """
+        node = self._find_node(word)
+        if node < 0 or self._word_ids[node] == self.NO_WORD:
+            return default
+        return self._scores[node]
+
+    def count_prefix(self, word):
+        """
+        Number of words starting with @word
+        """
+        node, _ = self._locate(word)
+        return 0 if node < 0 else self._counts[node]
+
+    def top_k(self, prefix, k):
+        """
+        See |CompressedTrie.top_k|
+        """
+        node, path = self._locate(prefix)
+        if node < 0 or k <= 0:
+            return []
+
+        scores, best, first_child = self._scores, self._best, self._first_child
+        result = []
+        heap = [(-best[node], path, 1, node)]
+        while heap and len(result) < k:
+            score, path, kind, node = heappop(heap)
+            if kind == 0:
+                result.append((path, -score))
+                continue
+
+            if self._word_ids[node] != self.NO_WORD:
+                heappush(heap, (-scores[node], path, 0, node))
+            for child in range(first_child[node], first_child[node + 1]):
+                if best[child] != _NO_SCORE:
+                    heappush(heap, (-best[child], path + self._label(child), 1, child))
+
+        return result
+
+    def starts_with(self, word):
+        return list(self.iter_prefix(word))
+
+    def iter_prefix(self, prefix, limit=None, start_after=None):
+        """
+        See |CompressedTrie.iter_prefix|
+        """
+        node, path = self._locate(prefix)
+        if node < 0 or limit == 0:
+            return
+
+        seeking = False
+        if start_after is not None:
+            if start_after.startswith(path):
+                seeking = True
+            elif path < start_after:
+                return
+
+        word_ids, first_child = self._word_ids, self._first_child
+        found = 0
+        if word_ids[node] != self.NO_WORD and not seeking:
+            yield path
+            found += 1
+            if found == limit:
+                return
+
+        labels = [path]
+        stack = [(iter(range(first_child[node], first_child[node + 1])), seeking)]
+        while stack:
+            children, seeking = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                labels.pop()
+                continue
+
+            label = self._label(child)
+            child_seeking = False
+            if seeking:
+                child_path = "".join(labels) + label
+                if start_after.startswith(child_path):
+                    child_seeking = True
+                elif child_path < start_after:
+                    continue
+
+            labels.append(label)
+            if word_ids[child] != self.NO_WORD and not child_seeking:
+                yield "".join(labels)
+                found += 1
+                if found == limit:
+                    return
+            stack.append(
+                (iter(range(first_child[child], first_child[child + 1])), child_seeking)
+            )
+
+    def _label(self, node):
+        # Label of the edge leading to @node
+        offsets = self._label_offsets
+        return str(self._blob[offsets[node] : offsets[node + 1]], "utf-8")
+
+    def _child(self, node, char):
+        # Child of @node whose label starts with @char, -1 if none
+        lo, hi = self._first_child[node], self._first_child[node + 1]
+        code = ord(char)
+        idx = bisect_left(self._chars, code, lo, hi)
+        if idx == hi or self._chars[idx] != code:
+            return -1
+        return idx
+
+    def _find_node(self, word):
+        """
+        Node in which @word ends, -1 if there is none (see
+        |CompressedTrie._find_node|)
+        """
+        node = 0
+        i = 0
+        while i < len(word):
+            node = self._child(node, word[i])
+            if node < 0:
+                return -1
+            label = self._label(node)
+            if not word.startswith(label, i):
+                return -1
+            i += len(label)
+        return node
+
+    def _locate(self, prefix):
+        """
+        See |CompressedTrie._locate|, with -1 for no node
+        """
+        node = 0
+        i = 0
+        while i < len(prefix):
+            node = self._child(node, prefix[i])
+            if node < 0:
+                return -1, None
+
+            label = self._label(node)
+            n = min(len(label), len(prefix) - i)
+            if prefix[i : i + n] != label[:n]:
+                return -1, None
+            i += n
+
+            if n < len(label):
+                return node, prefix + label[n:]
+        return node, prefix
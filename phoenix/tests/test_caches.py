@@ -90,3 +90,618 @@ class TestFunctions(unittest.TestCase):
         cache.put("k2", "v2")
         cache.put("k6", "v6")
         cache.put("k3", "v3")
+
+    def test_concurrent_lru_segments(self):
+        cache = ConcurrentLRUCache(10, segments=4)
+        self.assertEqual(10, cache.capacity)
+        self.assertEqual(4, cache.segments)
+        self.assertEqual(10, sum(s.capacity for s in cache._segments))
+
+        # Never more segments than entries
+        self.assertEqual(2, ConcurrentLRUCache(2, segments=8).segments)
+
+    def test_concurrent_lru_single_segment(self):
+        # With a single segment it must behave exactly like LRUCache
+        cache = ConcurrentLRUCache(3, segments=1)
+        cache.put("k1", "v1")
+        cache.put("k2", "v2")
+        cache.put("k3", "v3")
+        cache.put("k2", "v22")
+        cache.put("k4", "v4")
+        self.assertEqual(None, cache.get("k1"))
+        self.assertEqual("v22", cache.get("k2"))
+        cache.put("k5", "v5")
+        self.assertEqual(None, cache.get("k3"))
+
+    def test_concurrent_lru_threads(self):
+        from threading import Thread
+
+        cache = ConcurrentLRUCache(1000, segments=8)
+
+        def worker(tid):
+            for i in range(200):
+                key = (tid, i)
+                cache.put(key, i)
+                self.assertEqual(i, cache.get(key))
+
+        threads = [Thread(target=worker, args=(t,)) for t in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(800, sum(s._cache_list.size() for s in cache._segments))
+
+    def test_lru_ttl(self):
+        now = 0
+        cache = LRUCache(3, ttl=10, clock=lambda: now)
+        cache.put("k1", "v1")
+        cache.put("k2", "v2", ttl=5)
+        cache.put("k3", "v3", ttl=100)
+
+        now = 5
+        self.assertEqual("v1", cache.get("k1"))
+        self.assertEqual(None, cache.get("k2"))
+        self.assertEqual(2, len(cache._lookup))
+
+        # Writing resets the deadline
+        cache.put("k1", "v11")
+        now = 12
+        self.assertEqual("v11", cache.get("k1"))
+        self.assertEqual("v3", cache.get("k3"))
+
+    def test_lru_ttl_reclaim(self):
+        now = 0
+        cache = LRUCache(3, ttl=10, clock=lambda: now)
+        cache.put("k1", "v1")
+        cache.put("k2", "v2")
+        cache.put("k3", "v3", ttl=50)
+
+        # Expired entries don't force the eviction of live ones
+        now = 20
+        cache.put("k4", "v4")
+        self.assertEqual(2, len(cache._lookup))
+        self.assertEqual("v3", cache.get("k3"))
+        self.assertEqual("v4", cache.get("k4"))
+
+        now = 60
+        self.assertEqual(2, cache.expire())
+        self.assertEqual(0, cache._cache_list.size())
+
+    def test_lru_access_ttl(self):
+        now = 0
+        cache = LRUCache(3, ttl=20, access_ttl=5, clock=lambda: now)
+        cache.put("k1", "v1")
+        cache.put("k2", "v2")
+
+        for now in (4, 8, 12, 16):
+            self.assertEqual("v1", cache.get("k1"))
+        self.assertEqual(None, cache.get("k2"))
+
+        # Reads never extend the entry past its write deadline
+        now = 20
+        self.assertEqual(None, cache.get("k1"))
+
+    def test_lfu_ttl(self):
+        now = 0
+        cache = LFUCache(2, ttl=10, clock=lambda: now)
+        cache.put(1, 1)
+        cache.put(2, 2, ttl=1000)
+        self.assertEqual(1, cache.get(1))
+        self.assertEqual(1, cache.get(1))
+
+        now = 11
+        self.assertEqual(None, cache.get(1))
+
+        # Only the live entry is left so nothing needs to be evicted
+        cache.put(3, 3, ttl=20)
+        self.assertEqual(2, cache.get(2))
+        self.assertEqual(3, cache.get(3))
+
+        now = 100
+        self.assertEqual(1, cache.expire())
+        self.assertEqual(1, len(cache._cache_map))
+        self.assertEqual(1, cache._freq_list.size())
+
+    def test_expiration_workflow(self):
+        now = 0
+        cache = LFUCache(2, ttl=1, clock=lambda: now)
+        cache.put(1, 1)
+
+        workflow = CacheExpirationWorkflow(cache, interval_secs=0.5)
+        now = 5
+        self.assertEqual(0.5, workflow.run_step())
+        self.assertEqual(0, len(cache._cache_map))
+
+    def test_lru_max_weight(self):
+        cache = LRUCache(None, weigher=lambda k, v: len(v), max_weight=10)
+        cache.put("k1", "aaaa")
+        cache.put("k2", "bbbb")
+        self.assertEqual(8, cache.current_weight)
+
+        self.assertEqual("aaaa", cache.get("k1"))
+        cache.put("k3", "ccc")
+        self.assertEqual(None, cache.get("k2"))
+        self.assertEqual(7, cache.current_weight)
+
+        # Growing an existing entry
+        cache.put("k3", "cccccc")
+        self.assertEqual(10, cache.current_weight)
+        self.assertEqual("aaaa", cache.get("k1"))
+
+        # Heavier than the whole budget, it is rejected without flushing the cache
+        cache.put("k4", "d" * 11)
+        self.assertEqual(None, cache.get("k4"))
+        self.assertEqual(10, cache.current_weight)
+        cache.put("k1", "a" * 11)
+        self.assertEqual(None, cache.get("k1"))
+        self.assertEqual(6, cache.current_weight)
+
+    def test_lru_weight_and_capacity(self):
+        cache = LRUCache(2, weigher=lambda k, v: v, max_weight=100)
+        cache.put("k1", 10)
+        cache.put("k2", 10)
+        cache.put("k3", 10)
+        self.assertEqual(None, cache.get("k1"))
+        self.assertEqual(20, cache.current_weight)
+
+    def test_lfu_max_weight(self):
+        cache = LFUCache(None, weigher=lambda k, v: v, max_weight=10)
+        cache.put(1, 4)
+        cache.put(2, 4)
+        cache.get(1)
+        cache.put(3, 5)
+        self.assertEqual(None, cache.get(2))
+        self.assertEqual(4, cache.get(1))
+        self.assertEqual(9, cache.current_weight)
+
+        cache.put(3, 2)
+        self.assertEqual(6, cache.current_weight)
+
+        # The new entry has the lowest frequency but is not the one evicted
+        cache.put(4, 7)
+        self.assertEqual(None, cache.get(3))
+        self.assertEqual(None, cache.get(1))
+        self.assertEqual(7, cache.get(4))
+        self.assertEqual(7, cache.current_weight)
+
+        cache.put(5, 11)
+        self.assertEqual(None, cache.get(5))
+        self.assertEqual(7, cache.current_weight)
+
+    def test_count_min_sketch(self):
+        sketch = CountMinSketch(64, sample_size=1000)
+        for _ in range(5):
+            sketch.increment("hot")
+        sketch.increment("cold")
+        self.assertGreaterEqual(sketch.estimate("hot"), 5)
+        self.assertGreaterEqual(sketch.estimate("cold"), 1)
+        self.assertEqual(0, sketch.estimate("missing"))
+
+        for _ in range(100):
+            sketch.increment("hot")
+        self.assertEqual(CountMinSketch.MAX_COUNT, sketch.estimate("hot"))
+
+        sketch.age()
+        self.assertEqual(CountMinSketch.MAX_COUNT // 2, sketch.estimate("hot"))
+
+    def test_tiny_lfu_basic(self):
+        cache = TinyLFUCache(10)
+        for i in range(10):
+            cache.put(i, str(i))
+        for i in range(10):
+            self.assertEqual(str(i), cache.get(i))
+
+        cache.put(3, "33")
+        self.assertEqual("33", cache.get(3))
+        self.assertEqual(10, len(cache._lookup))
+
+    def test_tiny_lfu_scan_resistance(self):
+        cache = TinyLFUCache(100)
+        hot = list(range(50))
+        for _ in range(5):
+            for k in hot:
+                if cache.get(k) is None:
+                    cache.put(k, k)
+
+        # One hit wonders must not flush the frequent keys
+        for k in range(1000, 2000):
+            cache.put(k, k)
+
+        self.assertEqual(100, len(cache._lookup))
+        self.assertEqual(50, sum(1 for k in hot if cache.get(k) == k))
+
+    def test_tiny_lfu_tiny_capacity(self):
+        cache = TinyLFUCache(1)
+        cache.put(1, 1)
+        cache.put(2, 2)
+        self.assertEqual(None, cache.get(1))
+        self.assertEqual(2, cache.get(2))
+
+        cache = TinyLFUCache(0)
+        cache.put(1, 1)
+        self.assertEqual(None, cache.get(1))
+
+    def test_lru_get_put_many(self):
+        cache = LRUCache(4)
+        cache.put_many([("k1", "v1"), ("k2", "v2"), ("k3", "v3")])
+        hits, misses = cache.get_many(["k1", "k4", "k3", "k1", "k4"])
+        self.assertEqual({"k1": "v1", "k3": "v3"}, hits)
+        # Repeated keys are reported and counted once, missing ones too
+        self.assertEqual(["k4"], misses)
+        self.assertEqual((2, 1), (cache.stats().hits, cache.stats().misses))
+
+        # k2 is the oldest now, then k1 and k3
+        cache.put_many({"k4": "v4", "k5": "v5", "k3": "v33"})
+        self.assertEqual(4, cache._cache_list.size())
+        self.assertEqual(None, cache.get("k2"))
+        self.assertEqual(["k3", "k5", "k4", "k1"], [n.key for n in _lru_order(cache)])
+
+        # A batch bigger than the cache keeps its newest entries
+        cache.put_many([(i, i) for i in range(6)])
+        self.assertEqual([5, 4, 3, 2], [n.key for n in _lru_order(cache)])
+
+    def test_lru_get_many_ttl(self):
+        now = 0
+        cache = LRUCache(4, ttl=10, clock=lambda: now)
+        cache.put_many({"k1": "v1", "k2": "v2"})
+        cache.put("k3", "v3", ttl=100)
+
+        now = 50
+        hits, misses = cache.get_many(["k1", "k2", "k3"])
+        self.assertEqual({"k3": "v3"}, hits)
+        self.assertEqual(["k1", "k2"], misses)
+        self.assertEqual(1, len(cache._lookup))
+
+    def test_lfu_get_put_many(self):
+        cache = LFUCache(2)
+        cache.put_many([(1, 1), (2, 2)])
+        hits, misses = cache.get_many([1, 1, 3, 3])
+        self.assertEqual({1: 1}, hits)
+        self.assertEqual([3], misses)
+        self.assertEqual((1, 1), (cache.stats().hits, cache.stats().misses))
+
+        cache.put_many({3: 3})
+        self.assertEqual(None, cache.get(2))
+        self.assertEqual(({1: 1, 3: 3}, []), cache.get_many([1, 3]))
+
+    def test_concurrent_lru_many(self):
+        cache = ConcurrentLRUCache(100, segments=8)
+        cache.put_many({i: str(i) for i in range(50)})
+        hits, misses = cache.get_many(list(range(60)) * 2)
+        self.assertEqual({i: str(i) for i in range(50)}, hits)
+        self.assertEqual(list(range(50, 60)), sorted(misses))
+
+    def test_concurrent_lru_rejects_empty(self):
+        with self.assertRaises(ValueError):
+            ConcurrentLRUCache(0)
+        with self.assertRaises(ValueError):
+            ConcurrentLRUCache(10, segments=0)
+
+    def test_lru_resize(self):
+        evicted = []
+        cache = LRUCache(4, on_evict=lambda k, v, r: evicted.append(k))
+        cache.put_many([(i, i) for i in range(4)])
+        cache.get(0)
+
+        cache.resize(2)
+        self.assertEqual(2, cache.capacity)
+        self.assertEqual([1, 2], evicted)
+        self.assertEqual([0, 3], [n.key for n in _lru_order(cache)])
+
+        cache.resize(3)
+        cache.put(4, 4)
+        self.assertEqual(3, len(cache._lookup))
+        self.assertEqual([1, 2], evicted)
+
+    def test_lru_resize_to_zero(self):
+        cache = LRUCache(2)
+        cache.put_many({1: 1, 2: 2})
+
+        cache.resize(0)
+        self.assertEqual(0, len(cache._lookup))
+        cache.put(3, 3)
+        cache.put_many({4: 4})
+        self.assertEqual(None, cache.get(3))
+        self.assertEqual(0, len(cache._lookup))
+
+    def test_lfu_resize(self):
+        cache = LFUCache(3)
+        cache.put(1, 1)
+        cache.put(2, 2)
+        cache.put(3, 3)
+        cache.get(1)
+        cache.get(3)
+
+        cache.resize(1)
+        self.assertEqual(1, len(cache._cache_map))
+        self.assertEqual(3, cache.get(3))
+
+        cache.resize(2)
+        cache.put(4, 4)
+        self.assertEqual(({3: 3, 4: 4}, []), cache.get_many([3, 4]))
+
+    def test_lfu_decay(self):
+        cache = LFUCache(3)
+        cache.put("old", 1)
+        for _ in range(6):
+            cache.get("old")
+        cache.put("a", 1)
+        cache.get("a")
+        cache.get("a")
+        cache.put("b", 1)
+        # old: 7, a: 3, b: 1
+        self.assertEqual([1, 3, 7], _lfu_frequencies(cache))
+
+        cache.decay()
+        # 1 -> 1, 3 -> 1 (merged with b's node), 7 -> 3
+        self.assertEqual([1, 3], _lfu_frequencies(cache))
+        self.assertEqual(["b", "a"], _lfu_keys(cache._freq_list.head()))
+
+        # a still points to its merged frequency node, which must forward to b's
+        cache.get("a")
+        self.assertEqual([1, 2, 3], _lfu_frequencies(cache))
+        cache.get("a")
+        cache.get("a")
+        cache.put("c", 1)
+        self.assertEqual(None, cache.get("b"))
+
+        cache.decay(reset=True)
+        self.assertEqual([1], _lfu_frequencies(cache))
+        # Former order is kept: c (1) is evicted before a (4) and old (3)
+        self.assertEqual(["c", "old", "a"], _lfu_keys(cache._freq_list.head()))
+        cache.put("d", 1)
+        self.assertEqual(None, cache.get("c"))
+
+    def test_list_extend(self):
+        from phoenix.lists import SentinelDoublyList
+
+        l1 = SentinelDoublyList()
+        l2 = SentinelDoublyList()
+        nodes = [LRUCache.CacheNode(i, i) for i in range(4)]
+        l1.append(nodes[0])
+        l2.append(nodes[1])
+        l2.append(nodes[2])
+        l1.extend(l2)
+        l1.extend(SentinelDoublyList())
+        l1.append(nodes[3])
+
+        self.assertEqual(4, l1.size())
+        self.assertTrue(l2.is_empty())
+        self.assertEqual(None, l2.head())
+        self.assertEqual(nodes[3], l1.tail())
+        self.assertEqual(nodes[2], l1.prev(nodes[3]))
+        self.assertEqual(nodes[1], l1.next(nodes[0]))
+
+
+def _lfu_frequencies(cache):
+    frequencies = []
+    fnode = cache._freq_list.head()
+    while fnode is not None:
+        frequencies.append(fnode.f)
+        fnode = cache._freq_list.next(fnode)
+    return frequencies
+
+
+def _lfu_keys(fnode):
+    keys = []
+    cnode = fnode.c_list.head()
+    while cnode is not None:
+        keys.append(cnode.key)
+        cnode = fnode.c_list.next(cnode)
+    return keys
+
+
+def _lru_order(cache):
+    n = cache._cache_list.head()
+    while n is not None:
+        yield n
+        n = cache._cache_list.next(n)
+
+
+class TestCached(unittest.TestCase):
+    def test_memoization(self):
+        calls = []
+
+        @cached(capacity=2)
+        def square(x, offset=0):
+            calls.append(x)
+            return x * x + offset
+
+        self.assertEqual(4, square(2))
+        self.assertEqual(4, square(2))
+        self.assertEqual(5, square(2, offset=1))
+        self.assertEqual(9, square(3))
+        self.assertEqual([2, 2, 3], calls)
+
+        stats = square.stats()
+        self.assertEqual(1, stats.hits)
+        self.assertEqual(3, stats.misses)
+        self.assertEqual(3, stats.loads)
+        self.assertEqual(0, stats.load_failures)
+
+    def test_none_results_and_errors(self):
+        calls = []
+
+        @cached(policy="lfu")
+        def load(x):
+            calls.append(x)
+            if x < 0:
+                raise ValueError(x)
+            return None
+
+        self.assertEqual(None, load(1))
+        self.assertEqual(None, load(1))
+        self.assertEqual([1], calls)
+
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                load(-1)
+        self.assertEqual([1, -1, -1], calls)
+        self.assertEqual(2, load.stats().load_failures)
+
+    def test_ttl(self):
+        calls = []
+
+        @cached(ttl=0)
+        def load(x):
+            calls.append(x)
+            return x
+
+        load(1)
+        load(1)
+        self.assertEqual([1, 1], calls)
+
+    def test_single_flight(self):
+        from threading import Event, Thread
+        from time import sleep
+
+        calls = []
+        release = Event()
+
+        @cached()
+        def slow(x):
+            calls.append(x)
+            release.wait()
+            return x * 10
+
+        results = []
+        threads = [Thread(target=lambda: results.append(slow(7))) for _ in range(20)]
+        for t in threads:
+            t.start()
+
+        # Wait until every thread registered its miss before releasing the loader
+        while slow.stats().misses < 20:
+            sleep(0.001)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual([7], calls)
+        self.assertEqual([70] * 20, results)
+        self.assertEqual(1, slow.stats().loads)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            cached(policy="fifo")
+
+
+class TestCompactLRUCache(unittest.TestCase):
+    def test_same_eviction_as_lru(self):
+        from random import Random
+
+        rnd = Random(7)
+        lru = LRUCache(50)
+        compact = CompactLRUCache(50)
+        for _ in range(5000):
+            key = rnd.randrange(120)
+            if rnd.random() < 0.5:
+                lru.put(key, key)
+                compact.put(key, key)
+            else:
+                self.assertEqual(lru.get(key), compact.get(key))
+
+        self.assertEqual(set(lru._lookup), set(compact._lookup))
+
+    def test_slots_reused(self):
+        cache = CompactLRUCache(3)
+        cache.put("k1", "v1")
+        cache.put("k2", "v2")
+        cache.put("k3", "v3")
+        cache.put("k1", "v11")
+        cache.put("k4", "v4")
+        self.assertEqual(None, cache.get("k2"))
+        self.assertEqual("v11", cache.get("k1"))
+
+        # k2's slot went through the free list and was handed to k4
+        self.assertEqual(1, cache._lookup["k4"])
+        self.assertEqual(CompactLRUCache.NIL, cache._free)
+        self.assertEqual(3, len(cache._keys))
+
+    def test_small_capacities(self):
+        cache = CompactLRUCache(1)
+        cache.put(1, 1)
+        cache.put(2, 2)
+        self.assertEqual(None, cache.get(1))
+        self.assertEqual(2, cache.get(2))
+
+        cache = CompactLRUCache(0)
+        cache.put(1, 1)
+        self.assertEqual(None, cache.get(1))
+
+
+class TestCacheStats(unittest.TestCase):
+    def test_lru_stats(self):
+        evicted = []
+        cache = LRUCache(2, on_evict=lambda k, v, r: evicted.append((k, v, r)))
+        cache.put("k1", "v1")
+        cache.put("k2", "v2")
+        cache.put("k1", "v11")
+        cache.get("k1")
+        cache.get("k3")
+        cache.put("k3", "v3")
+        cache.get_many(["k1", "k2"])
+
+        stats = cache.stats()
+        self.assertEqual(2, stats.hits)
+        self.assertEqual(2, stats.misses)
+        self.assertEqual(1, stats.evictions)
+        self.assertEqual(3, stats.insertions)
+        self.assertEqual(1, stats.updates)
+        self.assertEqual(0.5, stats.hit_rate)
+        self.assertEqual([("k2", "v2", EVICTED_CAPACITY)], evicted)
+
+    def test_eviction_reasons(self):
+        now = 0
+        evicted = []
+        cache = LRUCache(
+            None,
+            ttl=10,
+            clock=lambda: now,
+            weigher=lambda k, v: v,
+            max_weight=10,
+            on_evict=lambda k, v, r: evicted.append((k, r)),
+        )
+        cache.put("k1", 6)
+        cache.put("k2", 6)
+        now = 20
+        cache.get("k2")
+        self.assertEqual([("k1", EVICTED_WEIGHT), ("k2", EVICTED_EXPIRED)], evicted)
+
+    def test_lfu_stats(self):
+        evicted = []
+        cache = LFUCache(2, on_evict=lambda k, v, r: evicted.append((k, v, r)))
+        cache.put(1, 1)
+        cache.put(2, 2)
+        cache.get(1)
+        cache.put(3, 3)
+        cache.get(2)
+        cache.put(3, 33)
+
+        self.assertEqual(
+            CacheStatsSnapshot(
+                hits=1, misses=1, evictions=1, insertions=3, updates=1, hit_rate=0.5
+            ),
+            cache.stats(),
+        )
+        self.assertEqual([(2, 2, EVICTED_CAPACITY)], evicted)
+
+    def test_concurrent_stats_export(self):
+        from phoenix.monitoring import register_stats, unregister_stats, export_stats
+
+        cache = ConcurrentLRUCache(10, segments=4)
+        for i in range(20):
+            cache.put(i, i)
+        for i in range(20):
+            cache.get(i)
+
+        register_stats("test_cache", cache.stats)
+        try:
+            exported = export_stats()["test_cache"]
+        finally:
+            unregister_stats("test_cache")
+
+        self.assertEqual(20, exported["insertions"])
+        self.assertEqual(10, exported["evictions"])
+        self.assertEqual(20, exported["hits"] + exported["misses"])
+        self.assertNotIn("test_cache", export_stats())
@@ -1,7 +1,23 @@
 # TODO: proper test cases
 
+import os
+import tempfile
+from bisect import bisect_right
+from functools import partial
 from unittest import TestCase
-from phoenix.hash_ring import HashRing, RingNode, ReshardUnit, PartitionRange
+from unittest.mock import patch
+from phoenix.hash_ring import (
+    HashRing,
+    RingNode,
+    ReshardUnit,
+    PartitionRange,
+    ReshardCost,
+    RingBalance,
+    reshard_cost,
+    blake2b_hash,
+    builtin_hash,
+    xxhash_hash,
+)
 
 
 class TestFunctions(TestCase):
@@ -370,3 +386,465 @@ class TestFunctions(TestCase):
         self.assertEqual(
             "shard_0", HashRing._find_partition(ring._ring, 900000000).data
         )
+
+    def test_find_many(self):
+        ring = HashRing(spreading_factor=16)
+        for i in range(5):
+            ring.add("shard_{}".format(i))
+
+        keys = ["key_{}".format(i) for i in range(1000)] + list(range(100))
+        self.assertEqual([ring.find(k) for k in keys], ring.find_many(keys))
+        self.assertEqual([], ring.find_many([]))
+
+        # The lookup tables follow the ring changes
+        ring.add("shard_5")
+        self.assertEqual([ring.find(k) for k in keys], ring.find_many(keys))
+
+        # Same answers without NumPy
+        with patch("phoenix.hash_ring.np", None):
+            self.assertEqual([ring.find(k) for k in keys], ring.find_many(keys))
+
+        # Hashers without a batched version are called key by key
+        ring = HashRing(spreading_factor=16, key_hasher=builtin_hash)
+        for i in range(5):
+            ring.add("shard_{}".format(i))
+        self.assertEqual([ring.find(k) for k in keys], ring.find_many(keys))
+
+    def test_find_wraps_around(self):
+        vertexes = [200000000, 500000000]
+        ring = HashRing(spreading_factor=2, key_hasher=builtin_hash)
+        ring.add("shard_0", hash_generator=lambda: vertexes.pop())
+        ring.spreading_factor = 1
+        ring.add("shard_1", hash_generator=lambda: 800000000)
+
+        # Python ints hash to themselves
+        self.assertEqual("shard_1", ring.find(100))
+        self.assertEqual("shard_0", ring.find(200000000))
+        self.assertEqual("shard_1", ring.find(900000000))
+        self.assertEqual(
+            ["shard_1", "shard_0", "shard_0", "shard_1"],
+            ring.find_many([100, 200000000, 799999999, 800000000]),
+        )
+
+    def test_stable_placement(self):
+        def build():
+            ring = HashRing(spreading_factor=8)
+            for i in range(4):
+                ring.add("shard_{}".format(i))
+            return ring
+
+        r1 = build()
+        r2 = build()
+        self.assertEqual([n.start for n in r1._ring], [n.start for n in r2._ring])
+        self.assertEqual(32, len(set(n.start for n in r1._ring)))
+
+        keys = ["key_{}".format(i) for i in range(200)]
+        self.assertEqual(r1.find_many(keys), r2.find_many(keys))
+
+        # Placement only depends on the node identity, not on the insertion order
+        r3 = HashRing(spreading_factor=8)
+        for i in reversed(range(4)):
+            r3.add("shard_{}".format(i))
+        self.assertEqual(r1.find_many(keys), r3.find_many(keys))
+
+    def test_stable_hash_across_processes(self):
+        import os
+        import subprocess
+        import sys
+
+        code = (
+            "from phoenix.hash_ring import blake2b_hash as h;"
+            "print(h('some key'), h(b'some key'), h(7))"
+        )
+        path = os.pathsep.join(sys.path)
+        out = {
+            subprocess.check_output(
+                [sys.executable, "-c", code],
+                env={"PYTHONHASHSEED": str(seed), "PYTHONPATH": path},
+            )
+            for seed in (1, 2)
+        }
+        self.assertEqual(1, len(out))
+        self.assertEqual(
+            "{} {} {}".format(
+                blake2b_hash("some key"), blake2b_hash(b"some key"), blake2b_hash(7)
+            ),
+            out.pop().decode().strip(),
+        )
+
+    def test_xxhash_hash_without_xxhash(self):
+        with patch("phoenix.hash_ring.xxhash", None):
+            with self.assertRaises(RuntimeError):
+                xxhash_hash("some key")
+
+    def test_remove(self):
+        vertexes = [100000000, 400000000, 700000000]
+        ring = HashRing(spreading_factor=3)
+        ring.add("shard_0", hash_generator=lambda: vertexes.pop())
+        vertexes = [200000000, 800000000]
+        ring.spreading_factor = 2
+        ring.add("shard_1", hash_generator=lambda: vertexes.pop())
+        ring.spreading_factor = 1
+        ring.add("shard_2", hash_generator=lambda: 900000000)
+
+        moves = ring.remove("shard_1")
+        self.assertEqual(
+            [
+                ReshardUnit(
+                    RingNode(200000000, "shard_1"),
+                    RingNode(100000000, "shard_0"),
+                    [PartitionRange(200000000, 200000000)],
+                ),
+                ReshardUnit(
+                    RingNode(800000000, "shard_1"),
+                    RingNode(700000000, "shard_0"),
+                    [PartitionRange(800000000, 100000000)],
+                ),
+            ],
+            moves,
+        )
+        self.assertEqual(
+            [100000000, 400000000, 700000000, 900000000], [n.start for n in ring._ring]
+        )
+        self.assertEqual([n.start for n in ring._ring], ring._starts)
+
+        # Wrap around: the last node's range loops to the first node, and the first
+        # node's predecessor is the last one
+        moves = ring.remove("shard_2")
+        self.assertEqual(
+            [
+                ReshardUnit(
+                    RingNode(900000000, "shard_2"),
+                    RingNode(700000000, "shard_0"),
+                    [
+                        PartitionRange(900000000, 100000000),
+                        PartitionRange(0, 100000000),
+                    ],
+                )
+            ],
+            moves,
+        )
+
+        # Removing the last data moves nothing anywhere
+        self.assertEqual([], ring.remove("shard_0"))
+        self.assertEqual([], ring._ring)
+
+        with self.assertRaises(KeyError):
+            ring.remove("shard_0")
+
+    def test_remove_consecutive_and_wrapping_nodes(self):
+        vertexes = [100000000, 200000000, 900000000]
+        ring = HashRing(spreading_factor=3)
+        ring.add("shard_1", hash_generator=lambda: vertexes.pop())
+        ring.spreading_factor = 1
+        ring.add("shard_0", hash_generator=lambda: 500000000)
+
+        moves = ring.remove("shard_1")
+        # Every range of shard_1 goes to shard_0, which precedes all of them
+        self.assertEqual(
+            [RingNode(500000000, "shard_0")] * 3, [m.to_node for m in moves]
+        )
+        self.assertEqual(
+            [
+                [PartitionRange(100000000, 100000000)],
+                [PartitionRange(200000000, 300000000)],
+                [PartitionRange(900000000, 100000000), PartitionRange(0, 100000000)],
+            ],
+            [m.ranges for m in moves],
+        )
+        self.assertEqual("shard_0", ring.find("anything"))
+
+    def test_remove_then_add_is_stable(self):
+        ring = HashRing(spreading_factor=16)
+        for i in range(4):
+            ring.add("shard_{}".format(i))
+        keys = ["key_{}".format(i) for i in range(500)]
+        before = ring.find_many(keys)
+
+        ring.remove("shard_2")
+        after = ring.find_many(keys)
+        for b, a in zip(before, after):
+            # Only the keys of the removed shard move
+            if b != "shard_2":
+                self.assertEqual(b, a)
+            self.assertNotEqual("shard_2", a)
+
+        ring.add("shard_2")
+        self.assertEqual(before, ring.find_many(keys))
+
+    def test_add_many(self):
+        keys = ["key_{}".format(i) for i in range(500)]
+        r1 = HashRing(spreading_factor=300)
+        for i in range(4):
+            r1.add("shard_{}".format(i))
+
+        # Over MERGE_THRESHOLD new nodes, so the batch is spliced in one pass
+        r2 = HashRing(spreading_factor=300)
+        self.assertEqual([], r2.add_many(["shard_{}".format(i) for i in range(4)]))
+        self.assertEqual([n.start for n in r1._ring], r2._starts)
+        self.assertEqual(r1.find_many(keys), r2.find_many(keys))
+
+        moves = r2.add_many(["shard_4", "shard_5"])
+        self.assertEqual(600, len(moves))
+        for m in moves:
+            self.assertIn(m.to_node.data, ("shard_4", "shard_5"))
+            # Moves are computed against the ring before the batch
+            self.assertNotIn(m.from_node.data, ("shard_4", "shard_5"))
+
+        owners = r2.find_many(keys)
+        for before, after in zip(r1.find_many(keys), owners):
+            if after not in ("shard_4", "shard_5"):
+                self.assertEqual(before, after)
+
+    def test_add_rejects_stuck_generator(self):
+        ring = HashRing(spreading_factor=2)
+        with self.assertRaises(ValueError):
+            ring.add("shard_0", hash_generator=lambda: 100)
+
+        # Nothing was left behind by the failed add
+        self.assertEqual(set(), ring._used_starts)
+        ring.spreading_factor = 1
+        ring.add("shard_0", hash_generator=lambda: 100)
+        self.assertEqual([RingNode(100, "shard_0")], ring._ring)
+
+    def test_weighted_add(self):
+        ring = HashRing(spreading_factor=100)
+        ring.add("small", weight=0.5)
+        ring.add("big", weight=2)
+        ring.add("tiny", weight=0.001)
+        self.assertEqual(50, len(ring._nodes_by_data["small"]))
+        self.assertEqual(200, len(ring._nodes_by_data["big"]))
+        self.assertEqual(1, len(ring._nodes_by_data["tiny"]))
+
+        ring.remove("tiny")
+        owners = ring.find_many(["key_{}".format(i) for i in range(10000)])
+        # The big one takes about 4 times the keys of the small one
+        ratio = owners.count("big") / owners.count("small")
+        self.assertTrue(3 < ratio < 5)
+
+        with self.assertRaises(ValueError):
+            ring.add("empty", weight=0)
+
+    def test_set_weight(self):
+        ring = HashRing(spreading_factor=10)
+        ring.add("shard_0")
+        ring.add("shard_1")
+        keys = ["key_{}".format(i) for i in range(2000)]
+        before = ring.find_many(keys)
+
+        moves = ring.set_weight("shard_0", 3)
+        self.assertEqual(20, len(moves))
+        self.assertEqual(["shard_0"] * 20, [m.to_node.data for m in moves])
+        # Only keys moving to shard_0 changed owner
+        after = ring.find_many(keys)
+        for b, a in zip(before, after):
+            self.assertTrue(a == b or a == "shard_0")
+
+        # Same ring as adding it with that weight in the first place
+        fresh = HashRing(spreading_factor=10)
+        fresh.add("shard_0", weight=3)
+        fresh.add("shard_1")
+        self.assertEqual(fresh._starts, ring._starts)
+
+        moves = ring.set_weight("shard_0", 1)
+        self.assertEqual(20, len(moves))
+        self.assertEqual(["shard_0"] * 20, [m.from_node.data for m in moves])
+        self.assertEqual(before, ring.find_many(keys))
+        self.assertEqual([n.start for n in ring._ring], ring._starts)
+
+        with self.assertRaises(KeyError):
+            ring.set_weight("shard_2", 1)
+
+    def test_bounded_loads(self):
+        ring = HashRing(spreading_factor=16, load_epsilon=0.25)
+        for i in range(4):
+            ring.add("shard_{}".format(i))
+        owner = ring.find("hot")
+
+        # Every request for the same hot key, the owner saturates and the next ones
+        # clockwise take the overflow
+        for _ in range(100):
+            ring.record_load(ring.find("hot"))
+        self.assertEqual(100, sum(ring.load("shard_{}".format(i)) for i in range(4)))
+        for i in range(4):
+            self.assertTrue(ring.load("shard_{}".format(i)) <= 32)
+        self.assertEqual(32, ring.load(owner))
+        self.assertNotEqual(owner, ring.find("hot"))
+        self.assertEqual([ring.find("hot")], ring.find_many(["hot"]))
+
+        ring.release_load(owner, 10)
+        self.assertEqual(owner, ring.find("hot"))
+        with self.assertRaises(ValueError):
+            ring.release_load(owner, 100)
+        with self.assertRaises(KeyError):
+            ring.record_load("shard_9")
+
+        ring.remove(owner)
+        self.assertEqual(0, ring.load(owner))
+        self.assertEqual(68, ring._total_load)
+
+        with self.assertRaises(ValueError):
+            HashRing(load_epsilon=0)
+        unbounded = HashRing()
+        unbounded.add("shard_0")
+        with self.assertRaises(ValueError):
+            unbounded.load_capacity("shard_0")
+
+    def test_find_replicas(self):
+        ring = HashRing(spreading_factor=32)
+        for i in range(6):
+            ring.add("shard_{}".format(i))
+
+        def walk(key, n):
+            # Straight walk of the ring, skipping the datas already seen
+            idx = bisect_right(ring._starts, blake2b_hash(key) % HashRing.RING_SIZE)
+            replicas = []
+            for i in range(idx - 1, idx - 1 + len(ring._ring)):
+                data = ring._ring[i % len(ring._ring)].data
+                if data not in replicas:
+                    replicas.append(data)
+            return replicas[:n]
+
+        keys = ["key_{}".format(i) for i in range(500)]
+        for key in keys:
+            replicas = ring.find_replicas(key, 3)
+            self.assertEqual(walk(key, 3), replicas)
+            self.assertEqual(ring.find(key), replicas[0])
+            self.assertEqual(replicas[:2], ring.find_replicas(key, 2))
+        self.assertEqual([walk(k, 3) for k in keys], ring.find_replicas_many(keys, 3))
+        with patch("phoenix.hash_ring.np", None):
+            self.assertEqual(
+                [walk(k, 3) for k in keys], ring.find_replicas_many(keys, 3)
+            )
+
+        # No more than the datas on the ring
+        self.assertEqual(6, len(ring.find_replicas("key", 10)))
+
+        # The table follows the ring changes
+        ring.remove("shard_0")
+        ring.add("shard_6")
+        self.assertEqual([walk(k, 4) for k in keys], ring.find_replicas_many(keys, 4))
+
+        with self.assertRaises(ValueError):
+            ring.find_replicas("key", 0)
+
+    def test_snapshot(self):
+        ring = HashRing(spreading_factor=16)
+        for i in range(5):
+            ring.add("shard_{}".format(i), weight=1 + i % 2)
+        keys = ["key_{}".format(i) for i in range(1000)] + list(range(50))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ring.bin")
+            ring.save(path)
+            # 24 bytes header, 12 per node and the datas table
+            self.assertTrue(os.path.getsize(path) < 24 + 12 * len(ring._ring) + 200)
+
+            loaded = HashRing.from_file(path)
+            self.assertEqual(16, loaded.spreading_factor)
+            self.assertEqual(ring._starts, list(loaded._starts))
+            for k in keys:
+                self.assertEqual(ring.find(k), loaded.find(k))
+            self.assertEqual(ring.find_many(keys), loaded.find_many(keys))
+            with patch("phoenix.hash_ring.np", None):
+                self.assertEqual(ring.find_many(keys), loaded.find_many(keys))
+            self.assertEqual(
+                ring.find_replicas_many(keys, 3), loaded.find_replicas_many(keys, 3)
+            )
+            # Still a snapshot, nothing was copied
+            self.assertTrue(loaded._snapshot is not None)
+            self.assertEqual(ring.to_bytes(), loaded.to_bytes())
+
+            # Changes go on from where the saved ring was
+            self.assertEqual(ring.add("shard_5"), loaded.add("shard_5"))
+            self.assertEqual(
+                ring.set_weight("shard_1", 1), loaded.set_weight("shard_1", 1)
+            )
+            self.assertEqual(ring.remove("shard_0"), loaded.remove("shard_0"))
+            self.assertEqual(ring._starts, loaded._starts)
+            self.assertEqual(ring.find_many(keys), loaded.find_many(keys))
+            del loaded
+
+        copy = HashRing.from_bytes(ring.to_bytes())
+        self.assertEqual(ring.find_many(keys), copy.find_many(keys))
+        with self.assertRaises(ValueError):
+            HashRing.from_bytes(ring.to_bytes(), key_hasher=builtin_hash)
+        with self.assertRaises(ValueError):
+            HashRing.from_bytes(b"x" * 64)
+
+    def test_snapshot_hasher_objects(self):
+        class Hasher(object):
+            def __call__(self, key):
+                return blake2b_hash(key)
+
+        keys = ["key_{}".format(i) for i in range(200)]
+        hasher = partial(blake2b_hash)
+        ring = HashRing(spreading_factor=4, key_hasher=hasher)
+        ring.add_many(["shard_0", "shard_1", "shard_2"])
+
+        copy = HashRing.from_bytes(ring.to_bytes(), key_hasher=partial(blake2b_hash))
+        self.assertEqual(ring.find_many(keys), copy.find_many(keys))
+        # Told apart by their type, or name for functions
+        for other in (Hasher(), blake2b_hash, lambda key: blake2b_hash(key)):
+            with self.assertRaises(ValueError):
+                HashRing.from_bytes(ring.to_bytes(), key_hasher=other)
+
+        ring = HashRing(spreading_factor=4, key_hasher=Hasher())
+        ring.add("shard_0")
+        copy = HashRing.from_bytes(ring.to_bytes(), key_hasher=Hasher())
+        self.assertEqual(ring.find_many(keys), copy.find_many(keys))
+
+    def test_balance(self):
+        self.assertEqual(RingBalance({}, 0.0, 0.0), HashRing().balance())
+
+        vertexes = [100000000, 500000000]
+        ring = HashRing(spreading_factor=2)
+        ring.add("shard_0", hash_generator=lambda: vertexes.pop())
+        ring.spreading_factor = 1
+        ring.add("shard_1", hash_generator=lambda: 700000000)
+
+        balance = ring.balance()
+        # shard_1 wraps around from 700M up to shard_0's first start
+        self.assertEqual({"shard_0": 0.6, "shard_1": 0.4}, balance.fractions)
+        self.assertAlmostEqual(0.1, balance.stddev)
+        self.assertAlmostEqual(1.2, balance.max_avg)
+        with patch("phoenix.hash_ring.np", None):
+            self.assertEqual(balance, ring.balance())
+
+        ring = HashRing(spreading_factor=256)
+        ring.add_many("shard_{}".format(i) for i in range(8))
+        balance = ring.balance()
+        self.assertAlmostEqual(1, sum(balance.fractions.values()))
+        self.assertTrue(balance.max_avg < 1.3)
+        self.assertEqual(balance, HashRing.from_bytes(ring.to_bytes()).balance())
+
+    def test_dry_run(self):
+        ring = HashRing(spreading_factor=64)
+        for i in range(5):
+            ring.add("shard_{}".format(i))
+        self.assertEqual(ReshardCost(0, 0, 0, 0, None), HashRing().dry_run_add("a"))
+        starts = list(ring._starts)
+
+        cost = ring.dry_run_add("shard_5", weight=2, total_bytes=10**9)
+        self.assertEqual(starts, ring._starts)
+        self.assertEqual(reshard_cost(ring.add("shard_5", weight=2), 10**9), cost)
+        self.assertEqual(128, cost.moves)
+        self.assertTrue(0.1 < cost.fraction < 0.4)
+        self.assertEqual(round(cost.fraction * 10**9), cost.bytes)
+
+        starts = list(ring._starts)
+        cost = ring.dry_run_remove("shard_0")
+        self.assertEqual(starts, ring._starts)
+        self.assertEqual(reshard_cost(ring.remove("shard_0")), cost)
+        with self.assertRaises(KeyError):
+            ring.dry_run_remove("shard_0")
+
+        # New nodes next to each other and wrapping around the end
+        ring.spreading_factor = 3
+        vertexes = [990000000, 980000000, 5]
+        cost = ring.dry_run_add("shard_6", hash_generator=lambda: vertexes.pop())
+        vertexes = [990000000, 980000000, 5]
+        self.assertEqual(
+            reshard_cost(ring.add("shard_6", hash_generator=lambda: vertexes.pop())),
+            cost,
+        )
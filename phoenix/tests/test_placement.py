@@ -0,0 +1,97 @@
+import unittest
+from collections import Counter
+from unittest.mock import patch
+from phoenix.placement import JumpHash, RendezvousHash, PlacementMove, jump_hash
+
+
+class TestFunctions(unittest.TestCase):
+    def test_jump_hash(self):
+        for key in range(0, 2**64, 2**58 + 12345):
+            self.assertEqual(0, jump_hash(key, 1))
+            buckets = [jump_hash(key, n) for n in range(1, 50)]
+            # Growing by one bucket either keeps a key or moves it to the new one
+            for n, (before, after) in enumerate(zip(buckets, buckets[1:]), 2):
+                self.assertTrue(after == before or after == n - 1)
+        self.assertEqual(-1, jump_hash(42, 0))
+
+    def test_jump_add_remove(self):
+        engine = JumpHash()
+        self.assertEqual([], engine.add("shard_0"))
+        engine.add("shard_1")
+        engine.add("shard_2")
+        keys = ["key_{}".format(i) for i in range(3000)]
+        before = engine.find_many(keys)
+
+        moves = engine.add("shard_3")
+        self.assertEqual(
+            [PlacementMove("shard_{}".format(i), "shard_3", 1 / 12) for i in range(3)],
+            moves,
+        )
+        after = engine.find_many(keys)
+        for b, a in zip(before, after):
+            self.assertTrue(a == b or a == "shard_3")
+
+        # Removing the last one restores the previous placement
+        self.assertEqual(3, len(engine.remove("shard_3")))
+        self.assertEqual(before, engine.find_many(keys))
+
+        # Any other one is replaced by the last one
+        moves = engine.remove("shard_0")
+        self.assertEqual(PlacementMove("shard_0", "shard_2", 1 / 3), moves[0])
+        for b, a in zip(before, engine.find_many(keys)):
+            if b == "shard_0":
+                self.assertEqual("shard_2", a)
+            elif b == "shard_1":
+                self.assertEqual("shard_1", a)
+
+        with self.assertRaises(KeyError):
+            engine.remove("shard_0")
+        with self.assertRaises(ValueError):
+            engine.add("shard_1")
+
+    def test_rendezvous_add_remove(self):
+        engine = RendezvousHash()
+        for i in range(4):
+            engine.add("shard_{}".format(i))
+        keys = ["key_{}".format(i) for i in range(3000)]
+        before = engine.find_many(keys)
+
+        moves = engine.add("shard_4")
+        self.assertAlmostEqual(1 / 5, sum(m.fraction for m in moves))
+        after = engine.find_many(keys)
+        for b, a in zip(before, after):
+            self.assertTrue(a == b or a == "shard_4")
+
+        # Only the keys of the removed data move, wherever it is
+        moves = engine.remove("shard_1")
+        self.assertAlmostEqual(1 / 5, sum(m.fraction for m in moves))
+        for b, a in zip(after, engine.find_many(keys)):
+            self.assertTrue(a == b or b == "shard_1")
+
+        with self.assertRaises(KeyError):
+            engine.remove("shard_1")
+
+    def test_rendezvous_weights(self):
+        engine = RendezvousHash()
+        engine.add("small")
+        engine.add("big", weight=3)
+        owners = Counter(engine.find_many("key_{}".format(i) for i in range(20000)))
+        self.assertTrue(2.7 < owners["big"] / owners["small"] < 3.3)
+
+        with self.assertRaises(ValueError):
+            engine.add("empty", weight=0)
+
+    def test_find_many(self):
+        keys = ["key_{}".format(i) for i in range(2000)] + list(range(100))
+        for engine in (JumpHash(), RendezvousHash()):
+            for i in range(13):
+                engine.add("shard_{}".format(i))
+
+            owners = [engine.find(k) for k in keys]
+            self.assertEqual(owners, engine.find_many(keys))
+            with patch("phoenix.placement.np", None):
+                self.assertEqual(owners, engine.find_many(keys))
+
+            # Close to a perfect spread
+            counts = Counter(owners).values()
+            self.assertTrue(max(counts) < 1.3 * len(keys) / 13)
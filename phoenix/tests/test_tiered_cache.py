@@ -0,0 +1,97 @@
+import os
+import unittest
+from phoenix.tiered_cache import TieredCache, CompactionWorkflow
+
+
+class TestFunctions(unittest.TestCase):
+    def test_spill_and_promote(self):
+        with TieredCache(2) as cache:
+            cache.put("k1", {"v": 1})
+            cache.put("k2", b"raw")
+            cache.put("k3", [3])
+
+            # k1 was spilled to disk instead of lost
+            self.assertEqual(1, cache.disk_size())
+            self.assertEqual({"v": 1}, cache.get("k1"))
+
+            # Promoting k1 spilled k2, the oldest of the hot tier
+            self.assertEqual(1, cache.disk_size())
+            self.assertEqual(b"raw", cache.get("k2"))
+            self.assertEqual([3], cache.get("k3"))
+            self.assertEqual(None, cache.get("k4"))
+
+            stats = cache.stats()
+            self.assertEqual(3, stats.disk_hits)
+            self.assertEqual(1, stats.misses)
+            self.assertEqual(4, stats.spills)
+
+    def test_overwrite_discards_disk_copy(self):
+        with TieredCache(1) as cache:
+            cache.put("k1", "v1")
+            cache.put("k2", "v2")
+            cache.put("k1", "v11")
+            self.assertEqual("v11", cache.get("k1"))
+            self.assertEqual("v2", cache.get("k2"))
+
+    def test_compaction(self):
+        with TieredCache(1, segment_size=64) as cache:
+            value = b"x" * 30
+            for i in range(10):
+                cache.put(i, value)
+
+            # Overwrites most of the spilled entries with small values, leaving dead
+            # bytes behind
+            for i in range(8):
+                cache.put(i, i)
+
+            directory = cache._directory
+            files = len(os.listdir(directory))
+            self.assertEqual(10.0, CompactionWorkflow(cache).run_step())
+            self.assertTrue(len(os.listdir(directory)) < files)
+            self.assertTrue(cache.stats().compactions > 0)
+            for s in cache._segments:
+                if s is not cache._active:
+                    self.assertTrue(s.live_bytes >= 0.5 * s.used_bytes)
+
+            for i in range(8):
+                self.assertEqual(i, cache.get(i))
+            for i in range(8, 10):
+                self.assertEqual(value, cache.get(i))
+
+        self.assertFalse(os.path.exists(directory))
+
+    def test_large_values(self):
+        with TieredCache(1, segment_size=16) as cache:
+            cache.put("big", b"y" * 100)
+            cache.put("other", 1)
+            self.assertEqual(b"y" * 100, cache.get("big"))
+
+    def test_compaction_of_large_values(self):
+        with TieredCache(1, segment_size=16) as cache:
+            for i in range(20):
+                cache.put(i, b"y" * 100)
+            # The large values never took the place of the active segment
+            self.assertEqual(0, cache._active.used_bytes)
+
+            for i in range(20):
+                cache.put(i, i)
+            cache.compact()
+
+            # Every segment of a large value was dead, and went away
+            self.assertEqual([], [s for s in cache._segments if s.size > 16])
+            for i in range(20):
+                self.assertEqual(i, cache.get(i))
+
+    def test_close(self):
+        cache = TieredCache(1)
+        cache.put("k1", "v1")
+        cache.put("k2", "v2")
+        directory = cache._directory
+
+        cache.close()
+        cache.close()
+        self.assertFalse(os.path.exists(directory))
+        with self.assertRaises(ValueError):
+            cache.put("k3", "v3")
+        with self.assertRaises(ValueError):
+            cache.get("k1")
@@ -0,0 +1,43 @@
+import unittest
+from phoenix.timer_wheel import TimerWheel
+
+
+class TestFunctions(unittest.TestCase):
+    def test_fires_in_order(self):
+        wheel = TimerWheel(0, resolution=1.0, slots=4)
+        wheel.schedule("a", 1.5)
+        wheel.schedule("b", 3)
+        wheel.schedule("c", 9.2)  # More than one lap away
+
+        self.assertEqual([], wheel.advance(1.9))
+        self.assertEqual(["a"], wheel.advance(2))
+        self.assertEqual(["b"], wheel.advance(3))
+        # Shares the bucket with "c" ticks 6 and 10 but must not fire early
+        self.assertEqual([], wheel.advance(6))
+        self.assertEqual([], wheel.advance(9.9))
+        self.assertEqual(["c"], wheel.advance(10))
+        self.assertEqual(0, wheel.size())
+
+    def test_reschedule_and_cancel(self):
+        wheel = TimerWheel(0, resolution=1.0, slots=8)
+        a = wheel.schedule("a", 2)
+        b = wheel.schedule("b", 2)
+        wheel.reschedule(a, 5)
+        wheel.cancel(b)
+        wheel.cancel(b)
+
+        self.assertEqual([], wheel.advance(4))
+        self.assertEqual(["a"], wheel.advance(5))
+
+    def test_long_idle_gap(self):
+        wheel = TimerWheel(0, resolution=1.0, slots=4)
+        for i in range(10):
+            wheel.schedule(i, i + 1)
+
+        self.assertEqual(list(range(6)), sorted(wheel.advance(6)))
+        self.assertEqual(list(range(6, 10)), sorted(wheel.advance(100)))
+
+    def test_past_deadline(self):
+        wheel = TimerWheel(10, resolution=1.0, slots=4)
+        wheel.schedule("a", 3)
+        self.assertEqual(["a"], wheel.advance(11))
@@ -1,7 +1,11 @@
 # TODO: proper test cases
 
+import gc
+import os
+import random
+import tempfile
 import unittest
-from phoenix.trie import CompressedTrie
+from phoenix.trie import CompressedTrie, FrozenTrie
 
 
 class TestFunctions(unittest.TestCase):
@@ -29,9 +33,337 @@ class TestFunctions(unittest.TestCase):
         self.assertFalse(trie.search("faceb"))
         self.assertFalse(trie.search("therein"))
         self.assertEqual(["facing"], trie.starts_with("faci"))
-        self.assertEqual(["this", "the", "there", "then"], trie.starts_with("th"))
+        self.assertEqual(["the", "then", "there", "this"], trie.starts_with("th"))
         self.assertEqual([], trie.starts_with("fab"))
         self.assertEqual(["face", "facebook"], trie.starts_with("face"))
         self.assertEqual(
             ["face", "facebook", "facing", "factory"], trie.starts_with("fac")
-        )
\ No newline at end of file
+        )
+
+    def test_values(self):
+        trie = CompressedTrie()
+        trie.insert("facebook", 1)
+        trie.insert("face", 2)
+        trie.insert("facing", 3)
+        trie.insert("face", 4)
+
+        self.assertEqual(3, len(trie))
+        self.assertEqual(4, trie.get("face"))
+        self.assertEqual(1, trie.get("facebook"))
+        self.assertEqual(None, trie.get("fac"))
+        self.assertEqual(0, trie.get("faces", 0))
+
+        trie.insert("", 5)
+        self.assertEqual(5, trie.get(""))
+        self.assertTrue(trie.search(""))
+        self.assertEqual(4, len(trie))
+
+    def test_delete(self):
+        words = ["facebook", "face", "this", "there", "then", "the", "facing", "fact"]
+        trie = CompressedTrie()
+        for i, word in enumerate(words):
+            trie.insert(word, i)
+
+        self.assertFalse(trie.delete("fac"))
+        self.assertFalse(trie.delete("faces"))
+        self.assertFalse(trie.delete("zebra"))
+
+        self.assertTrue(trie.delete("face"))
+        self.assertFalse(trie.search("face"))
+        self.assertEqual(0, trie.get("facebook"))
+        # "face" no longer splits "facebook", the edges merged back
+        self.assertEqual("ebook", trie.root.children["f"].edges["e"])
+        self.assertEqual(["facebook", "facing", "fact"], trie.starts_with("fac"))
+
+        self.assertTrue(trie.delete("facing"))
+        self.assertTrue(trie.delete("fact"))
+        self.assertEqual("facebook", trie.root.edges["f"])
+
+        self.assertTrue(trie.delete("the"))
+        self.assertEqual(["then", "there", "this"], trie.starts_with("th"))
+        self.assertEqual(4, len(trie))
+        _check_compressed(self, trie.root, is_root=True)
+
+        for word in ["facebook", "this", "there", "then"]:
+            self.assertTrue(trie.delete(word))
+        self.assertEqual(0, len(trie))
+        self.assertEqual({}, trie.root.children)
+
+    def test_count_prefix(self):
+        trie = CompressedTrie()
+        for word in ["facebook", "face", "this", "there", "then", "the", "facing"]:
+            trie.insert(word)
+        trie.insert("face")
+
+        self.assertEqual(7, trie.count_prefix(""))
+        self.assertEqual(3, trie.count_prefix("fac"))
+        self.assertEqual(2, trie.count_prefix("face"))
+        self.assertEqual(1, trie.count_prefix("faceb"))
+        self.assertEqual(3, trie.count_prefix("the"))
+        self.assertEqual(0, trie.count_prefix("fab"))
+        self.assertEqual(0, trie.count_prefix("facebooks"))
+
+        trie.delete("the")
+        self.assertEqual(2, trie.count_prefix("the"))
+        _check_compressed(self, trie.root, is_root=True)
+
+    def test_random_inserts_and_deletes(self):
+        rnd = random.Random(7)
+        trie = CompressedTrie()
+        expected = {}
+        for _ in range(3000):
+            word = "".join(rnd.choice("abc") for _ in range(rnd.randint(0, 6)))
+            if rnd.random() < 0.6:
+                trie.insert(word, len(expected))
+                expected[word] = len(expected)
+            else:
+                self.assertEqual(word in expected, trie.delete(word))
+                expected.pop(word, None)
+
+        _check_compressed(self, trie.root, is_root=True)
+        self.assertEqual(len(expected), len(trie))
+        for word, value in expected.items():
+            self.assertEqual(value, trie.get(word))
+        self.assertEqual(sorted(expected), sorted(trie.starts_with("")))
+        self.assertEqual(
+            len([w for w in expected if w.startswith("ab")]), trie.count_prefix("ab")
+        )
+
+    def test_iter_prefix(self):
+        words = ["facebook", "face", "this", "there", "then", "the", "facing", "fact"]
+        trie = CompressedTrie()
+        for word in words:
+            trie.insert(word)
+
+        self.assertEqual(sorted(words), list(trie.iter_prefix("")))
+        self.assertEqual(["face", "facebook"], list(trie.iter_prefix("face")))
+        self.assertEqual(["facebook"], list(trie.iter_prefix("faceb")))
+        self.assertEqual([], list(trie.iter_prefix("fab")))
+        self.assertEqual(["the", "then"], list(trie.iter_prefix("th", limit=2)))
+        self.assertEqual([], list(trie.iter_prefix("th", limit=0)))
+
+        # Pagination
+        self.assertEqual(
+            ["there", "this"], list(trie.iter_prefix("th", start_after="then"))
+        )
+        self.assertEqual(
+            ["then", "there"], list(trie.iter_prefix("th", 2, start_after="the"))
+        )
+        self.assertEqual(["this"], list(trie.iter_prefix("th", start_after="thf")))
+        self.assertEqual(["the", "then"], list(trie.iter_prefix("th", 2, "ta")))
+        self.assertEqual([], list(trie.iter_prefix("th", start_after="zz")))
+        self.assertEqual([], list(trie.iter_prefix("th", start_after="this")))
+
+        pages = []
+        page = list(trie.iter_prefix("", limit=3))
+        while page:
+            pages.append(page)
+            page = list(trie.iter_prefix("", limit=3, start_after=page[-1]))
+        self.assertEqual(sorted(words), sum(pages, []))
+
+    def test_iter_prefix_is_lazy(self):
+        trie = CompressedTrie()
+        # A single very deep branch, over the recursion limit
+        for i in range(1, 1200):
+            trie.insert("a" * i)
+        self.assertEqual(1199, len(trie.starts_with("a")))
+
+        words = trie.iter_prefix("aa")
+        self.assertEqual("aa", next(words))
+        self.assertEqual("aaa", next(words))
+
+    def test_top_k(self):
+        scores = {"the": 50, "then": 20, "there": 20, "this": 35, "face": 10}
+        trie = CompressedTrie()
+        for word, score in scores.items():
+            trie.insert(word, score=score)
+        trie.insert("th")
+
+        self.assertEqual([("the", 50), ("this", 35)], trie.top_k("th", 2))
+        self.assertEqual(
+            [("the", 50), ("this", 35), ("then", 20), ("there", 20), ("th", 0)],
+            trie.top_k("th", 10),
+        )
+        self.assertEqual([("there", 20)], trie.top_k("ther", 5))
+        self.assertEqual([], trie.top_k("thx", 5))
+        self.assertEqual([], trie.top_k("th", 0))
+        self.assertEqual(35, trie.get_score("this"))
+        self.assertIsNone(trie.get_score("thi"))
+
+        # Lowering the best one hands its place over
+        self.assertTrue(trie.set_score("the", 1))
+        self.assertEqual([("this", 35), ("then", 20)], trie.top_k("th", 2))
+        self.assertFalse(trie.set_score("thi", 1))
+        trie.insert("there", score=99)
+        self.assertEqual([("there", 99)], trie.top_k("", 1))
+        trie.delete("there")
+        self.assertEqual([("this", 35)], trie.top_k("", 1))
+        _check_compressed(self, trie.root, is_root=True)
+
+    def test_random_top_k(self):
+        rnd = random.Random(11)
+        trie = CompressedTrie()
+        expected = {}
+        for _ in range(3000):
+            word = "".join(rnd.choice("abc") for _ in range(rnd.randint(0, 6)))
+            op = rnd.random()
+            if op < 0.5:
+                expected[word] = rnd.randint(-20, 20)
+                trie.insert(word, score=expected[word])
+            elif op < 0.7:
+                score = rnd.randint(-20, 20)
+                self.assertEqual(word in expected, trie.set_score(word, score))
+                if word in expected:
+                    expected[word] = score
+            else:
+                trie.delete(word)
+                expected.pop(word, None)
+
+        _check_compressed(self, trie.root, is_root=True)
+        for prefix in ("", "a", "ab", "cc", "bca"):
+            ranked = sorted(
+                ((w, s) for w, s in expected.items() if w.startswith(prefix)),
+                key=lambda item: (-item[1], item[0]),
+            )
+            self.assertEqual(ranked[:7], trie.top_k(prefix, 7))
+
+    def test_from_sorted(self):
+        words = ["facebook", "face", "this", "there", "then", "the", "facing", "fact"]
+        trie = CompressedTrie.from_sorted(sorted(words))
+        _check_compressed(self, trie.root, is_root=True)
+        self.assertEqual(sorted(words), trie.starts_with(""))
+        self.assertEqual(3, trie.count_prefix("the"))
+        self.assertFalse(trie.search("fac"))
+
+        # Values and scores, the last of a repeated word wins
+        trie = CompressedTrie.from_sorted(
+            [("", 0, 1), ("a", 1), ("a", 2, 7), ("ab", 3, 5), ("b", 4, 6)]
+        )
+        _check_compressed(self, trie.root, is_root=True)
+        self.assertEqual(4, len(trie))
+        self.assertEqual(0, trie.get(""))
+        self.assertEqual(2, trie.get("a"))
+        self.assertEqual([("a", 7), ("b", 6), ("ab", 5)], trie.top_k("", 3))
+
+        # Still a regular trie
+        trie.insert("abc")
+        trie.delete("ab")
+        _check_compressed(self, trie.root, is_root=True)
+
+        self.assertEqual(0, len(CompressedTrie.from_sorted([])))
+
+        # The collector's setting is the caller's, pause_gc only lasts the build
+        self.assertTrue(gc.isenabled())
+        paused = CompressedTrie.from_sorted(sorted(words), pause_gc=True)
+        self.assertTrue(gc.isenabled())
+        self.assertEqual(sorted(words), paused.starts_with(""))
+        gc.disable()
+        try:
+            CompressedTrie.from_sorted(sorted(words), pause_gc=True)
+            self.assertFalse(gc.isenabled())
+        finally:
+            gc.enable()
+        with self.assertRaises(ValueError):
+            CompressedTrie.from_sorted(["b", "a"])
+        with self.assertRaises(ValueError):
+            CompressedTrie.from_sorted(["a", ""])
+
+    def test_random_from_sorted(self):
+        rnd = random.Random(13)
+        for _ in range(20):
+            items = {
+                "".join(rnd.choice("abc") for _ in range(rnd.randint(0, 7))): (
+                    rnd.random(),
+                    rnd.randint(-5, 5),
+                )
+                for _ in range(rnd.randint(1, 300))
+            }
+            trie = CompressedTrie.from_sorted(
+                (word, value, score) for word, (value, score) in sorted(items.items())
+            )
+            _check_compressed(self, trie.root, is_root=True)
+
+            # Same shape as inserting the words one by one
+            inserted = CompressedTrie()
+            for word, (value, score) in items.items():
+                inserted.insert(word, value, score)
+            self.assertEqual(_edges(inserted.root), _edges(trie.root))
+            for word, (value, score) in items.items():
+                self.assertEqual(value, trie.get(word))
+            self.assertEqual(inserted.top_k("a", 5), trie.top_k("a", 5))
+
+    def test_freeze(self):
+        words = ["facebook", "face", "this", "there", "then", "the", "facing", "fact"]
+        # Siblings starting with the same UTF-8 byte, and an empty word
+        words += ["caf\u00e9", "caf\u00e8", "caf\u00e9s", "\u20acuro", ""]
+        trie = CompressedTrie()
+        for i, word in enumerate(words):
+            trie.insert(word, value=(i, word), score=i % 4)
+        frozen = trie.freeze()
+        self._check_frozen(trie, frozen)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trie.bin")
+            frozen.save(path)
+            loaded = FrozenTrie.from_file(path)
+            self._check_frozen(trie, loaded)
+            self.assertEqual(frozen.to_bytes(), loaded.to_bytes())
+            del loaded
+
+        # Empty trie, and a trie without values
+        self.assertEqual([], CompressedTrie().freeze().starts_with(""))
+        frozen = CompressedTrie.from_sorted(["a", "b"]).freeze()
+        self.assertEqual(["a", "b"], frozen.starts_with(""))
+        self.assertIsNone(frozen.get("a"))
+        self.assertEqual("x", frozen.get("c", "x"))
+
+        with self.assertRaises(ValueError):
+            FrozenTrie.from_bytes(b"x" * 64)
+
+    def test_random_freeze(self):
+        rnd = random.Random(17)
+        trie = CompressedTrie()
+        for _ in range(2000):
+            word = "".join(rnd.choice("ab\u00e9c") for _ in range(rnd.randint(0, 7)))
+            trie.insert(word, rnd.random(), rnd.randint(-9, 9))
+        self._check_frozen(trie, FrozenTrie.from_bytes(trie.freeze().to_bytes()))
+
+    def _check_frozen(self, trie, frozen):
+        words = trie.starts_with("")
+        self.assertEqual(len(trie), len(frozen))
+        self.assertEqual(words, frozen.starts_with(""))
+        prefixes = {w[:n] for w in words for n in range(len(w) + 2)}
+        for prefix in sorted(prefixes | {"zz", "fx", "caf\u00ea"}):
+            self.assertEqual(trie.search(prefix), frozen.search(prefix))
+            self.assertEqual(trie.get(prefix), frozen.get(prefix))
+            self.assertEqual(trie.get_score(prefix), frozen.get_score(prefix))
+            self.assertEqual(trie.count_prefix(prefix), frozen.count_prefix(prefix))
+            self.assertEqual(trie.starts_with(prefix), frozen.starts_with(prefix))
+            self.assertEqual(trie.top_k(prefix, 3), frozen.top_k(prefix, 3))
+            self.assertEqual(
+                list(trie.iter_prefix("", 4, start_after=prefix)),
+                list(frozen.iter_prefix("", 4, start_after=prefix)),
+            )
+
+
+def _edges(node, path=""):
+    # Paths of every node under @node, marking the ones a word ends in
+    paths = [(path, node.is_end)]
+    for key, child in node.children.items():
+        paths.extend(_edges(child, path + node.edges[key]))
+    return sorted(paths)
+
+
+def _check_compressed(test, node, is_root=False):
+    # Radix property, subtree counts and best scores of every node under @node
+    if not is_root:
+        test.assertTrue(node.is_end or len(node.children) > 1)
+    count = 1 if node.is_end else 0
+    best = node.score if node.is_end else float("-inf")
+    for key, child in node.children.items():
+        test.assertEqual(key, node.edges[key][0])
+        count += _check_compressed(test, child)
+        best = max(best, child.best)
+    test.assertEqual(count, node.count)
+    test.assertEqual(best, node.best)
+    return count